@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+from datetime import datetime
+
+from render import Template
+from output import write_output, render_output
+
+# Архив по дням: public/archive/ГГГГ-ММ-ДД.html пишется один раз,
+# public/archive.html — только оглавление по месяцам.
+
+ARCHIVE_DIR = "public/archive"
+ARCHIVE_INDEX = "public/archive.html"
+ARCHIVE_INDEX_JSON = "public/archive/index.json"
+
+MONTHS = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+          "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"]
+
+CARDS_START = "<!-- cards -->"
+CARDS_END = "<!-- /cards -->"
+
+
+PAGE_HEAD = Template("""<!DOCTYPE html>
+<html lang="ru">
+<head>
+  <meta charset="UTF-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  <title>{{ title }}</title>
+  <link rel="stylesheet" href="/style.css">
+  <link rel="stylesheet" href="/archive.css">
+</head>
+<body>
+""", "archive_head")
+
+PAGE_HEADER = Template("""<header style="background: linear-gradient(135deg, #444, #2f2f2f); color: #e0e0e0; text-align: center; padding: 3rem 1rem 2rem; border-bottom: 4px solid #2F4F4F; box-shadow: 0 4px 10px rgba(0,0,0,0.3);">
+  <div class="header-content">
+    <img src="/rf-flag.svg" alt="Флаг" class="flag-icon">
+    <div>
+      <h1>{{ h1 }}</h1>
+      <h2>{{ h2 }}</h2>
+      <a href="/index.html" class="button">← Вернуться на главную</a>
+{% for b in nav %}
+      <a href="{{ b.href }}" class="button">{{ b.label }}</a>
+{% endfor %}
+{% if search %}
+      <br>
+      <input type="search" id="site-search" placeholder="Поиск по архиву..." autocomplete="off">
+      <div id="search-results" class="search-results"></div>
+      <script src="/search.js" defer></script>
+{% endif %}
+    </div>
+  </div>
+</header>
+""", "archive_header")
+
+SHARD_PAGE = Template("""{{ head|safe }}{{ header|safe }}<main>
+{{ start|safe }}
+{% for b in blocks %}
+{{ b|safe }}
+{% endfor %}
+{{ end|safe }}
+</main>
+</body>
+</html>
+""", "archive_shard")
+
+INDEX_PAGE = Template("""{{ head|safe }}{{ header|safe }}<main class="archive-nav">
+{% for m in months %}
+<section class="archive-month">
+<h3>{{ m.title }}</h3>
+<ul class="archive-days">
+{% for d in m.days %}
+<li><a href="/archive/{{ d.day }}.html">{{ d.label }}</a> <small>({{ d.count }})</small></li>
+{% endfor %}
+</ul>
+</section>
+{% endfor %}
+</main>
+</body>
+</html>
+""", "archive_index")
+
+
+def page_head(title):
+    return PAGE_HEAD.render(title=title)
+
+
+def page_header(h1, h2, nav=(), search=False):
+    return PAGE_HEADER.render(h1=h1, h2=h2, nav=nav, search=search)
+
+
+def load_archive_index():
+    if not os.path.exists(ARCHIVE_INDEX_JSON):
+        return {}
+    with open(ARCHIVE_INDEX_JSON, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_archive_index(index):
+    write_output(ARCHIVE_INDEX_JSON, json.dumps(index, ensure_ascii=False, sort_keys=True, indent=0))
+
+
+def shard_path(day):
+    return os.path.join(ARCHIVE_DIR, f"{day}.html")
+
+
+def read_shard_cards(day):
+    path = shard_path(day)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read()
+    if CARDS_START not in raw:
+        return []
+    body = raw.split(CARDS_START, 1)[1].split(CARDS_END, 1)[0]
+    return re.findall(r"<article class='news-item.*?>.*?</article>", body, re.DOTALL)
+
+
+def write_shard(day, blocks, prev_day=None):
+    d = datetime.strptime(day, "%Y-%m-%d")
+    nice = d.strftime("%d.%m.%Y")
+    nav = []
+    if prev_day:
+        nav.append({"href": f"/archive/{prev_day}.html",
+                    "label": "← " + datetime.strptime(prev_day, "%Y-%m-%d").strftime("%d.%m.%Y")})
+    nav.append({"href": "/archive.html", "label": "Все дни"})
+    render_output(shard_path(day), SHARD_PAGE, head=page_head(f"Архив новостей — {nice}"),
+                  header=page_header("Архив новостей", nice, nav),
+                  start=CARDS_START, end=CARDS_END, blocks=[b.strip() for b in blocks])
+
+
+def write_archive_index(index):
+    months = {}
+    for day in sorted(index, reverse=True):
+        months.setdefault(day[:7], []).append(day)
+
+    rows = []
+    for month, days in months.items():
+        y, m = month.split("-")
+        rows.append({
+            "title": f"{MONTHS[int(m) - 1]} {y}",
+            "days": [{"day": day, "label": f"{day[8:]}.{m}", "count": index[day]} for day in days],
+        })
+
+    render_output(ARCHIVE_INDEX, INDEX_PAGE, head=page_head("Архив новостей"),
+                  header=page_header("Архив новостей", "Посты старше двух дней", search=True),
+                  months=rows)
+
+
+def archive_days(days):
+    # days: {"ГГГГ-ММ-ДД": [блоки карточек, новые сверху]}
+    if not days:
+        return []
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    index = load_archive_index()
+    written = []
+    for day in sorted(days):
+        blocks = days[day]
+        if day in index:
+            # Опоздавшие карточки за уже закрытый день — редкий случай
+            blocks = blocks + read_shard_cards(day)
+        earlier = [d for d in index if d < day]
+        write_shard(day, blocks, max(earlier) if earlier else None)
+        index[day] = len(blocks)
+        written.append(shard_path(day))
+    save_archive_index(index)
+    write_archive_index(index)
+    return written
+
+
+def split_legacy_archive(parse_ts):
+    # Разовый перенос старого монолитного archive.html в шарды по дням
+    if os.path.exists(ARCHIVE_INDEX_JSON) or not os.path.exists(ARCHIVE_INDEX):
+        return
+    with open(ARCHIVE_INDEX, "r", encoding="utf-8") as f:
+        blocks = re.findall(r"<article class='news-item.*?>.*?</article>", f.read(), re.DOTALL)
+    days = {}
+    for block in blocks:
+        ts = parse_ts(block)
+        if not ts:
+            print("Архив: карточка без даты — пропуск")
+            continue
+        days.setdefault(ts.strftime("%Y-%m-%d"), []).insert(0, block)
+    archive_days(days)
+    if not days:
+        save_archive_index({})
+        write_archive_index({})
+    print(f"Старый архив разбит на {len(days)} дней ({len(blocks)} карточек)")
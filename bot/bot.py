@@ -2,130 +2,157 @@
 import os
 import re
 import json
+import sys
+import time
+import threading
 import hashlib
 import pytz
 import telebot
-import requests
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from store import load_store, append_records, remove_records, compact_store, sorted_records
+from archive import archive_days, split_legacy_archive, load_archive_index
+from media import (download_all, find_media, DOWNLOAD_WORKERS, bootstrap_media_manifest,
+                   register_media, release_media, replace_media, expire_media, save_media_manifest,
+                   note_derivatives)
+from images import plan_image, picture_html, wait_for_images, settle_images
+from videos import (plan_video, video_html, wait_for_posters, settle_videos, pending_web, transcoded, remove_source,
+                    VIDEO_SOURCE_LIMIT)
+from vk import enqueue_vk, drain_outbox, vk_posted, VK_TOKEN, VK_GROUP_ID
+from ledger import Ledger
+from sitemap import write_urlset, SITEMAP_NEWS
+from render import Template
+from feeds import publish_feeds
+from output import start_build, finish_build, render_output, write_output
+from textproc import clean_text, detect_category, category_feeds
+from search import bootstrap_search, index_cards, move_docs
+from simhash import near_dupes, drop_near_dupes
+from metrics import start_run, finish_run, summary, span, timed, count
 
 TOKEN = os.getenv("TELEGRAM_TOKEN")
-VK_TOKEN = os.getenv("VK_TOKEN")
-VK_GROUP_ID = os.getenv("VK_GROUP_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
 CHANNEL_ID = "@newsSVOih"
 SEEN_IDS_FILE = "seen_ids.txt"
-VK_POSTED = "vk_posted.txt"
+SEEN_IDS_TTL_DAYS = 30
+POSTS_STORE = "posts_store.jsonl"
+UPDATE_OFFSET_FILE = "update_offset.txt"
+UPDATES_PAGE = 100
+NEWS_FILE = "public/news.html"
+VISIBLE_CARDS = 12
+# Лента для главной: public/feed/page-N.json по FEED_PAGE_SIZE карточек, N=1 — самые свежие
+NEWS_FEED_DIR = "public/feed"
+FEED_PAGE_SIZE = 9
+FEED_PAGE_RE = re.compile(r"^page-(\d+)\.json$")
+LD_JSON_RE = re.compile(r"<script type='application/ld\+json'>.*?</script>\n?", re.DOTALL)
+# Ленты по рубрикам: public/feeds/<slug>.xml и .atom (рубрики — bot/categories.json)
+CATEGORY_FEEDS = category_feeds()
+
+# Режим демона: long polling вместо запуска по крону
+LONG_POLL_TIMEOUT = 25
+DEBOUNCE_SECONDS = 3
+MAX_FLUSH_DELAY = 15
+ARCHIVE_INTERVAL = 3600
+FLUSH_RETRY = 30
+VK_DRAIN_INTERVAL = 10
+
+# Свой Bot API (локальный сервер или фейк для тестов)
+telebot.apihelper.API_URL = TELEGRAM_API_URL + "/bot{0}/{1}"
+telebot.apihelper.FILE_URL = TELEGRAM_API_URL + "/file/bot{0}/{1}"
+
+NEWS_CARD = Template("""<article class='news-item{% if urgent %} urgent{% endif %}' id='{{ post_id }}' lang='ru'>
+{% if urgent %}
+<p class='urgency-label'>СРОЧНО:</p>
+{% endif %}
+<h3 class='news-headline'>{{ headline }}</h3>
+{% if media %}
+{{ media|safe }}
+{% endif %}
+{% for p in paragraphs %}
+<p class='{{ p.cls }}'>{{ p.text }}</p>
+{% endfor %}
+<p class='timestamp' data-ts='{{ iso_time }}'>{{ fmt_time }}</p>
+<p class='source'>Источник: <a href='{{ tg_link }}' target='_blank' rel='noopener'>Новости для Своих</a></p>
+{% if more_media %}
+<p class='more-media'><a href='{{ tg_link }}' target='_blank' rel='noopener'>Ещё {{ more_media }} фото/видео в Telegram</a></p>
+{% endif %}
+<script type='application/ld+json'>{{ microdata|json }}</script>
+</article>
+""", "news_card")
+
+NEWS_PAGE = Template("""{% for c in cards %}
+{% if c.header %}
+<h2 class='category-header'>{{ c.header }}</h2>
+{% endif %}
+{{ c.html|safe }}
+{% endfor %}
+{% if more %}
+<button id="show-more" style="padding:10px 20px;background:#0077cc;color:#fff;border:none;border-radius:4px;cursor:pointer;margin:20px auto;display:block;">Показать ещё</button>
+<script>document.getElementById("show-more").onclick=()=>{document.querySelectorAll(".hidden").forEach(e=>e.classList.remove("hidden"));this.style.display="none"};</script>
+{% endif %}
+""", "news_page")
 
 bot = telebot.TeleBot(TOKEN)
 moscow = pytz.timezone("Europe/Moscow")
 
 
-def load_vk():
-    if not os.path.exists(VK_POSTED):
-        return set()
-    with open(VK_POSTED, "r", encoding="utf-8") as f:
-        return set(line.strip() for line in f if line.strip())
-
-
-def save_vk(posted_set):
-    with open(VK_POSTED, "w", encoding="utf-8") as f:
-        f.write("\n".join(sorted(posted_set)) + "\n")
-
-
 def hash_post_content(caption, text):
     return hashlib.md5(clean_text(caption + text).encode("utf-8")).hexdigest()
 
 
-def post_to_vk(caption, text, file_url=None, ctype=None, msg_id=None):
-    vk_seen = load_vk()
-    vk_key = hash_post_content(caption, text)
-    if vk_key in vk_seen:
-        print(f"ДУБЛЬ ВК — пропуск")
-        return
-    if not VK_TOKEN or not VK_GROUP_ID:
-        print("VK не настроен")
-        return
-
-    # Сохраняем переносы строк для ВК!
-    message = f"{caption}\n\n{text}".strip() or "Новость"
-    attachments = []
-
-    try:
-        if file_url and ctype == "photo":
-            data = requests.get(file_url).content
-            open("temp.jpg", "wb").write(data)
-            upload = requests.post(
-                requests.get(
-                    "https://api.vk.com/method/photos.getWallUploadServer",
-                    params={"group_id": VK_GROUP_ID, "access_token": VK_TOKEN, "v": "5.199"}
-                ).json()["response"]["upload_url"],
-                files={"photo": open("temp.jpg", "rb")}
-            ).json()
-            photo = requests.post("https://api.vk.com/method/photos.saveWallPhoto", data={
-                "group_id": VK_GROUP_ID, "photo": upload["photo"], "server": upload["server"],
-                "hash": upload["hash"], "access_token": VK_TOKEN, "v": "5.199"
-            }).json()["response"][0]
-            attachments.append(f"photo{photo['owner_id']}_{photo['id']}")
-            os.remove("temp.jpg")
-
-        elif file_url and ctype == "video":
-            size = len(requests.get(file_url, stream=True).content)
-            if size > 20_000_000:
-                print(f"Видео {size/1e6:.1f}МБ — слишком большое для ВК")
-                return
-            open("temp.mp4", "wb").write(requests.get(file_url).content)
-            video = requests.post("https://api.vk.com/method/video.save", data={
-                "group_id": VK_GROUP_ID, "name": caption[:50],
-                "access_token": VK_TOKEN, "v": "5.199"
-            }).json()["response"]
-            requests.post(video["upload_url"], files={"video_file": open("temp.mp4", "rb")})
-            attachments.append(f"video{video['owner_id']}_{video['video_id']}")
-            os.remove("temp.mp4")
-
-        requests.post("https://api.vk.com/method/wall.post", data={
-            "owner_id": f"-{VK_GROUP_ID}",
-            "from_group": 1,
-            "message": message[:4095],
-            "attachments": ",".join(attachments),
-            "access_token": VK_TOKEN,
-            "v": "5.199"
-        })
-        print("Запощено в ВК")
-        vk_seen.add(vk_key)
-        save_vk(vk_seen)
-    except Exception as e:
-        print(f"ВК ошибка: {e}")
-
-
-def clean_text(text):
-    if not text:
-        return ""
-    patterns = [r"Подписаться на новости для своих", r"https://t\.me/newsSVOih", r"РФ"]
-    for p in patterns:
-        text = re.sub(p, "", text, flags=re.IGNORECASE)
-    text = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]+', '', text)
-    # Сохраняем переносы строк!
-    return text.strip()
+def media_source(message):
+    if message.content_type == "photo":
+        return message.photo[-1], "public/media/photos", ".jpg"
+    if message.content_type == "video" and (message.video.file_size or 0) <= VIDEO_SOURCE_LIMIT:
+        return message.video, "public/media/videos", ".mp4"
+    return None
+
+
+@timed("get_file")
+def media_job(message):
+    tg_file, save_dir, ext = media_source(message)
+    fi = bot.get_file(tg_file.file_id)
+    return f"{TELEGRAM_API_URL}/file/bot{TOKEN}/{fi.file_path}", save_dir, ext, tg_file.file_unique_id
+
+
+@timed("media")
+def prefetch_media(messages):
+    # get_file и скачивание для всех новых постов параллельно,
+    # пачка фото грузится за время самого медленного файла.
+    # Уже известные по file_unique_id файлы не качаем вовсе.
+    media = {}
+    pending = []
+    for m in messages:
+        src = media_source(m)
+        if not src:
+            continue
+        known = find_media(src[0].file_unique_id)
+        if known:
+            print(f"Медиа уже есть: {known}")
+            media[m.message_id] = (None, known)
+        else:
+            pending.append(m)
 
+    def resolve(message):
+        try:
+            return media_job(message)
+        except Exception as e:
+            print(f"Ошибка get_file {message.message_id}: {e}")
+            return None
 
-def download_and_save(file_url, save_dir, ext):
-    try:
-        os.makedirs(save_dir, exist_ok=True)
-        fname = hashlib.md5(file_url.encode()).hexdigest() + ext
-        fpath = os.path.join(save_dir, fname)
-        data = requests.get(file_url).content
-        with open(fpath, "wb") as f:
-            f.write(data)
-        print(f"Сохранил: {fpath}")
-        return f"/media/{os.path.basename(save_dir)}/{fname}"
-    except Exception as e:
-        print(f"Ошибка скачивания {file_url}: {e}")
-        return file_url
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        resolved = dict(zip([m.message_id for m in pending], pool.map(resolve, pending)))
+    jobs = {mid: job for mid, job in resolved.items() if job}
+    paths = download_all(jobs)
+    media.update({mid: (jobs[mid][0], paths[mid]) for mid in jobs})
+    return media
 
 
 # ────────────────────────────────────────────────────────────────
 # ГЛАВНАЯ ПРАВКА: ТЕКСТ КАК В TELEGRAM (с переносами и пунктами)
 # ────────────────────────────────────────────────────────────────
-def format_post(message, caption_override=None, group_size=1, is_urgent=False):
+@timed("format_post")
+def format_post(message, caption_override=None, group_size=1, is_urgent=False, media=None, media_info=None):
     ts = message.date
     dt_moscow = datetime.fromtimestamp(ts, moscow)
     fmt_time = dt_moscow.strftime("%d.%m.%Y %H:%M")
@@ -153,71 +180,56 @@ def format_post(message, caption_override=None, group_size=1, is_urgent=False):
 
     telegram_url = None
     local_path = None
+    image_info = None
+    video_info = None
     content_type = None
     tg_link = f"https://t.me/{CHANNEL_ID[1:]}/{message.message_id}"
     post_id = f"post-{message.message_id}"
-    html = ""
+    media_html = ""
 
     # Категории
-    category = None
-    if any(w in full_text for w in ["Россия"]): category = "Россия"
-    elif any(w in full_text for w in ["Космос"]): category = "Космос"
-    elif any(w in full_text for w in ["Израиль", "Газа", "Мексика", "США", "Китай", "Тайвань", "Мир"]): category = "Мир"
-
-    if category:
-        html += f"<h2 class='category-header'>{category}</h2>\n"
-
-    urgency_class = " urgent" if is_urgent else ""
-    html += f"<article class='news-item{urgency_class}' id='{post_id}' lang='ru'>\n"
-
-    if is_urgent:
-        html += "<p class='urgency-label'>СРОЧНО:</p>\n"
-
-    html += f"<h3 class='news-headline'>{headline}</h3>\n"
+    category = detect_category(full_text)
 
     # Медиа
     if message.content_type == "photo":
-        fi = bot.get_file(message.photo[-1].file_id)
-        telegram_url = f"https://api.telegram.org/file/bot{TOKEN}/{fi.file_path}"
-        local_path = download_and_save(telegram_url, "public/media/photos", ".jpg")
-        html += f"<img src=\"{local_path}\" alt=\"Фото: {headline}\" loading=\"lazy\">\n"
-        content_type = "photo"
+        # Медиа берётся только из prefetch_media: не вышло get_file или скачивание —
+        # карточка без фото (повторный get_file упал бы посреди пачки)
+        telegram_url, local_path = media or (None, None)
+        if local_path:
+            image_info = media_info or plan_image(local_path)
+            if image_info:
+                note_derivatives(local_path, image_info["derivatives"])
+            media_html = picture_html(local_path, image_info, f"Фото: {headline}")
+            content_type = "photo"
 
     elif message.content_type == "video":
         try:
             size = message.video.file_size or 0
-            if size > 20_000_000:
+            if size > VIDEO_SOURCE_LIMIT:
                 print(f"Видео {size/1e6:.1f}МБ — пропуск (сайт + ВК)")
-                return "", None, None, tg_link
-            fi = bot.get_file(message.video.file_id)
-            telegram_url = f"https://api.telegram.org/file/bot{TOKEN}/{fi.file_path}"
-            local_path = download_and_save(telegram_url, "public/media/videos", ".mp4")
-            html += f"<video controls preload=\"metadata\">\n"
-            html += f"  <source src=\"{local_path}\" type=\"video/mp4\">\n"
-            html += f"  Ваш браузер не поддерживает видео.\n"
-            html += f"</video>\n"
-            content_type = "video"
+                return None
+            telegram_url, local_path = media or (None, None)
+            if local_path:
+                video_info = media_info or plan_video(local_path, media_source(message)[0].file_unique_id)
+                media_html = video_html(local_path, video_info)
+                if video_info:
+                    local_path = video_info["src"]
+                    note_derivatives(local_path, video_info["derivatives"])
+                content_type = "video"
         except Exception as e:
             print(f"Видео ошибка: {e}")
-            return "", None, None, tg_link
+            return None
 
     # ───── ТЕКСТ С ПЕРЕНОСАМИ И КРАСИВЫМИ ПУНКТАМИ ─────
-    if full_text.strip():
-        lines = full_text.strip().split('\n')
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            if line.startswith(('▪️', '•', '—', '-', '–', '•')):
-                html += f"<p class='bullet-point'>{line}</p>\n"
-            else:
-                html += f"<p class='news-text'>{line}</p>\n"
-
-    html += f"<p class='timestamp' data-ts='{iso_time}'>{fmt_time}</p>\n"
-    html += f"<p class='source'>Источник: <a href='{tg_link}' target='_blank' rel='noopener'>Новости для Своих</a></p>\n"
-
-    if group_size > 1:
-        html += f"<p class='more-media'><a href='{tg_link}' target='_blank' rel='noopener'>Ещё {group_size-1} фото/видео в Telegram</a></p>\n"
+    paragraphs = []
+    for line in full_text.strip().split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(('▪️', '•', '—', '-', '–', '•')):
+            paragraphs.append({"cls": "bullet-point", "text": line})
+        else:
+            paragraphs.append({"cls": "news-text", "text": line})
 
     microdata = {
         "@context": "https://schema.org", "@type": "NewsArticle",
@@ -227,11 +239,36 @@ def format_post(message, caption_override=None, group_size=1, is_urgent=False):
                       "logo": {"@type": "ImageObject", "url": "https://newsforsvoi.ru/logo.png"}},
         "articleBody": full_text.strip(), "url": tg_link
     }
-    if local_path:
+    if image_info:
+        microdata["image"] = {"@type": "ImageObject", "url": f"https://newsforsvoi.ru{local_path}",
+                              "width": image_info["width"], "height": image_info["height"]}
+    elif video_info and video_info["poster"]:
+        microdata["image"] = f"https://newsforsvoi.ru{video_info['poster']}"
+    elif local_path:
         microdata["image"] = f"https://newsforsvoi.ru{local_path}"
-    html += f"<script type='application/ld+json'>{json.dumps(microdata, ensure_ascii=False, indent=2)}</script>\n"
-    html += "</article>\n"
-    return html, telegram_url, content_type, tg_link
+    html = NEWS_CARD.render(
+        urgent=is_urgent, post_id=post_id, headline=headline, media=media_html.strip(),
+        paragraphs=paragraphs, iso_time=iso_time, fmt_time=fmt_time, tg_link=tg_link,
+        more_media=group_size - 1 if group_size > 1 else 0, microdata=microdata,
+    )
+
+    count("cards_rendered")
+    card = {
+        "key": str(getattr(message, "media_group_id", None) or message.message_id),
+        "message_id": message.message_id,
+        "media_group_id": getattr(message, "media_group_id", None),
+        "ts": ts,
+        "iso_time": iso_time,
+        "headline": headline,
+        "text": full_text.strip(),
+        "category": category,
+        "media_path": local_path if local_path and local_path.startswith("/media/") else None,
+        "content_type": content_type,
+        "urgent": is_urgent,
+        "tg_link": tg_link,
+        "html": html,
+    }
+    return card
 
 
 def extract_timestamp(block):
@@ -256,230 +293,492 @@ def extract_timestamp(block):
         return None
 
 
-def move_to_archive(fresh_news):
-    cutoff = datetime.now(moscow) - timedelta(days=2)
-    remaining = []
+@timed("archive")
+def move_to_archive(store):
+    # В архив уходят только целые дни, чтобы шард дня писался один раз
+    cutoff = (datetime.now(moscow) - timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0)
     archived = []
 
-    for block in fresh_news:
-        ts = extract_timestamp(block)
-        if not ts:
-            remaining.append(block)
-            continue
+    for card in sorted_records(store, reverse=False):
+        ts = datetime.fromtimestamp(card["ts"], moscow)
+        if ts >= cutoff:
+            break
 
-        if ts < cutoff:
-            visible_date_match = re.search(r"<p class='timestamp[^>]*>([^<]+)</p>", block)
-            visible_date = visible_date_match.group(1) if visible_date_match else ts.strftime("%d.%m.%Y %H:%M")
+        visible_date = ts.strftime("%d.%m.%Y %H:%M")
+        block = card["html"]
+        clean_block = re.sub(r"<picture>.*?</picture>\n?|<img[^>]*>|<video[^>]*>.*?</video>", "", block, flags=re.DOTALL)
+        clean_block = re.sub(r"<script type='application/ld\+json'>.*?</script>", "", clean_block, flags=re.DOTALL)
 
-            clean_block = re.sub(r"<img[^>]*>|<video[^>]*>.*?</video>", "", block, flags=re.DOTALL)
-            clean_block = re.sub(r"<script type='application/ld\+json'>.*?</script>", "", clean_block, flags=re.DOTALL)
+        if "Источник:" not in clean_block:
+            clean_block += f"\n<p class='source'>Источник: <a href='{card['tg_link']}' target='_blank' rel='noopener'>Новости для Своих</a></p>\n"
 
-            if "Источник:" not in clean_block:
-                tg_match = re.search(r"https://t\.me/[^'\"]+", block)
-                if tg_match:
-                    clean_block += f"\n<p class='source'>Источник: <a href='{tg_match.group(0)}' target='_blank' rel='noopener'>Новости для Своих</a></p>\n"
+        if "<p class='timestamp'" not in clean_block:
+            clean_block = re.sub(r"(</h3>)", r"\1\n<p class='timestamp archived'>" + visible_date + "</p>", clean_block, count=1)
 
-            if "<p class='timestamp'" not in clean_block:
-                clean_block = re.sub(r"(</h3>)", r"\1\n<p class='timestamp archived'>" + visible_date + "</p>", clean_block, count=1)
-
-            clean_block = clean_block.replace("class='news-item", "class='news-item archived", 1)
-            archived.append(clean_block)
-        else:
-            remaining.append(block)
+        clean_block = clean_block.replace("class='news-item", "class='news-item archived", 1)
+        archived.append((card, clean_block))
 
     if archived:
-        archive_path = "public/archive.html"
-        os.makedirs("public", exist_ok=True)
-        mode = "a" if os.path.exists(archive_path) and os.path.getsize(archive_path) > 100 else "w"
-        with open(archive_path, mode, encoding="utf-8") as f:
-            if mode == "w":
-                f.write("<!DOCTYPE html>\n<html lang='ru'>\n<head>\n<meta charset='utf-8'>\n<title>Архив новостей</title>\n")
-                f.write("<style>.news-item{margin:20px 0;padding:15px;background:#f9f9f9;border-left:4px solid #aaa;} .archived{opacity:0.95;}</style>\n</head>\n<body>\n")
-            for b in archived:
-                f.write(b.strip() + "\n")
-        print(f"Перемещено в архив: {len(archived)} карточек (старше 2 дней)")
-
-    return remaining
-
-
+        days = {}
+        urls = {}
+        for card, block in archived:
+            day = datetime.fromtimestamp(card["ts"], moscow).strftime("%Y-%m-%d")
+            days.setdefault(day, []).insert(0, block)
+            urls[card["key"]] = f"/archive/{day}.html#post-{card['message_id']}"
+        archive_days(days)
+        move_docs(urls)
+        for card, _ in archived:
+            if card.get("media_path"):
+                release_media(card["media_path"], card["key"])
+        keys = [card["key"] for card, _ in archived]
+        remove_records(POSTS_STORE, keys)
+        for k in keys:
+            store.pop(k, None)
+        print(f"Перемещено в архив: {len(archived)} карточек за {len(days)} дн.")
+
+    return len(archived)
+
+
+@timed("cleanup")
 def cleanup_old_media():
     cutoff = datetime.now(moscow) - timedelta(days=2)
-    folders = ["public/media/photos", "public/media/videos"]
-    deleted = 0
-    for folder in folders:
-        if not os.path.exists(folder):
-            continue
-        for fname in os.listdir(folder):
-            fpath = os.path.join(folder, fname)
-            if not os.path.isfile(fpath):
-                continue
-            mtime = datetime.fromtimestamp(os.path.getmtime(fpath), moscow)
-            if mtime < cutoff:
-                os.remove(fpath)
-                deleted += 1
-                print(f"Удалено старое медиа: {fpath}")
+    deleted = expire_media(cutoff.timestamp())
     if deleted:
         print(f"Всего удалено устаревших файлов: {deleted}")
+    save_media_manifest()
+
+
+@timed("sitemap")
+def update_sitemap(cards):
+    # lastmod — время свежей карточки, а не запуска: без новых постов sitemap не меняется
+    days = sorted(load_archive_index(), reverse=True)
+    newest = max((c["iso_time"] for c in cards), default=None) or (days[0] if days else None)
+    urls = [
+        ("/index.html", newest, "always", "1.0"),
+        ("/news.html", newest, "always", "0.9"),
+        ("/archive.html", days[0] if days else newest, "daily", "0.7"),
+    ]
+    urls += [(f"/archive/{day}.html", day, "never", "0.5") for day in days]
+    if write_urlset(SITEMAP_NEWS, urls):
+        print("sitemap обновлён")
+
+
+def feed_item(card):
+    title = re.sub(r"<[^>]+>", "", card["headline"]) or "Новость"
+    return {
+        "id": card["tg_link"],
+        "title": title,
+        "link": card["tg_link"],
+        "description": card.get("text") or title,
+        "ts": card["ts"],
+        "category": card.get("category"),
+        "media": card.get("media_path"),
+    }
+
+
+@timed("feeds")
+def generate_rss(cards):
+    items = [feed_item(card) for card in cards]
+    channel = {"title": "Новости для Своих", "link": "https://newsforsvoi.ru",
+               "description": "Репосты из @newsSVOih"}
+    feeds = [("public/rss.xml", "public/atom.xml", channel, items)]
+    for category, slug in CATEGORY_FEEDS.items():
+        feeds.append((f"public/feeds/{slug}.xml", f"public/feeds/{slug}.atom",
+                      dict(channel, title=f"Новости для Своих — {category}"),
+                      [i for i in items if i["category"] == category]))
+    changed = publish_feeds("news", feeds)
+    print(f"Ленты RSS/Atom: обновлено {len(changed)}")
+
+
+@timed("render")
+def render_news(cards):
+    rows = []
+    for i, card in enumerate(cards):
+        html = card["html"]
+        if i >= VISIBLE_CARDS:
+            html = html.replace("class='news-item", "class='news-item hidden", 1)
+        rows.append({"header": card.get("category") if i < VISIBLE_CARDS else None, "html": html})
+    render_output(NEWS_FILE, NEWS_PAGE, cards=rows, more=len(cards) > VISIBLE_CARDS)
+
+
+@timed("render_feed")
+def write_news_feed(cards):
+    # Разметка schema.org остаётся в news.html, во фрагменты её не кладём — они меньше.
+    # Хранилище держит пару дней постов, поэтому сдвиг всех страниц на новый пост дёшев
+    pages = max(1, (len(cards) + FEED_PAGE_SIZE - 1) // FEED_PAGE_SIZE)
+    for n in range(1, pages + 1):
+        chunk = cards[(n - 1) * FEED_PAGE_SIZE:n * FEED_PAGE_SIZE]
+        data = {
+            "page": n, "pages": pages,
+            "cards": [{"key": c["key"], "html": LD_JSON_RE.sub("", c["html"])} for c in chunk],
+            "next": f"/feed/page-{n + 1}.json" if n < pages else None,
+        }
+        write_output(os.path.join(NEWS_FEED_DIR, f"page-{n}.json"), json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    # Страницы за хвостом ленты больше не нужны, деплой удалит их и из бакета
+    for name in os.listdir(NEWS_FEED_DIR):
+        m = FEED_PAGE_RE.match(name)
+        if m and int(m.group(1)) > pages:
+            os.remove(os.path.join(NEWS_FEED_DIR, name))
+
+
+def import_news_html():
+    # Разовый перенос карточек из старого news.html в хранилище
+    if not os.path.exists(NEWS_FILE):
+        return []
+    with open(NEWS_FILE, "r", encoding="utf-8") as f:
+        blocks = re.findall(r"<article class='news-item.*?>.*?</article>", f.read(), re.DOTALL)
+    cards = []
+    for block in blocks:
+        post_id = re.search(r"id='post-(\d+)'", block)
+        ts = extract_timestamp(block)
+        if not post_id or not ts:
+            continue
+        headline = re.search(r"<h3[^>]*>(.*?)</h3>", block)
+        media = re.search(r"src=\"(/media/[^\"]+)\"", block)
+        link = re.search(r"https://t\.me/[^'\"]+", block)
+        cards.append({
+            "key": post_id.group(1),
+            "message_id": int(post_id.group(1)),
+            "media_group_id": None,
+            "ts": int(ts.timestamp()),
+            "iso_time": ts.isoformat(timespec='seconds'),
+            "headline": headline.group(1) if headline else "",
+            "category": None,
+            "media_path": media.group(1) if media else None,
+            "content_type": "video" if "<video" in block else ("photo" if media else None),
+            "urgent": "urgent" in block.split(">", 1)[0],
+            "tg_link": link.group(0) if link else f"https://t.me/{CHANNEL_ID[1:]}/{post_id.group(1)}",
+            "html": block.replace("class='news-item hidden", "class='news-item", 1),
+        })
+    print(f"Импортировано из news.html: {len(cards)} карточек")
+    return cards
 
 
-def update_sitemap():
-    now = datetime.now(moscow).isoformat(timespec='seconds')
-    sitemap = f"""<?xml version="1.0" encoding="UTF-8"?>
-<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-  <url><loc>https://newsforsvoi.ru/index.html</loc><lastmod>{now}</lastmod><changefreq>always</changefreq><priority>1.0</priority></url>
-  <url><loc>https://newsforsvoi.ru/news.html</loc><lastmod>{now}</lastmod><changefreq>always</changefreq><priority>0.9</priority></url>
-  <url><loc>https://newsforsvoi.ru/archive.html</loc><lastmod>{now}</lastmod><changefreq>daily</changefreq><priority>0.7</priority></url>
-  <url><loc>https://newsforsvoi.ru/history.html</loc><lastmod>{now}</lastmod><changefreq>daily</changefreq><priority>0.8</priority></url>
-</urlset>"""
-    with open("public/sitemap.xml", "w", encoding="utf-8") as f:
-        f.write(sitemap)
-    print("sitemap.xml обновлён")
-
-
-def generate_rss(news_blocks):
-    items = ""
-    for b in news_blocks[:20]:
-        title = re.search(r"<h3[^>]*>(.*?)</h3>", b)
-        link = re.search(r"https://t\.me/[^'\"]+", b)
-        date = re.search(r"data-ts='([^']+)'", b)
-        t = title.group(1) if title else "Новость"
-        t = re.sub(r"<[^>]+>", "", t)
-        l = link.group(0) if link else "https://t.me/newsSVOih"
-        d = date.group(1) if date else datetime.now(moscow).isoformat()
-        items += f"<item><title>{t}</title><link>{l}</link><description>{t}</description><pubDate>{d}</pubDate></item>\n"
-    rss = f"""<?xml version="1.0" encoding="UTF-8"?>
-<rss version="2.0">
-<channel>
-<title>Новости для Своих</title>
-<link>https://newsforsvoi.ru</link>
-<description>Репосты из @newsSVOih</description>
-{items}
-</channel>
-</rss>"""
-    with open("public/rss.xml", "w", encoding="utf-8") as f:
-        f.write(rss)
-    print("rss.xml обновлён")
+def load_posts_store():
+    if not os.path.exists(POSTS_STORE):
+        append_records(POSTS_STORE, import_news_html())
+    store, garbage = load_store(POSTS_STORE)
+    if garbage > len(store):
+        compact_store(POSTS_STORE, store)
+    bootstrap_media_manifest(store.values())
+    return store
 
 
 def load_seen_ids():
-    if not os.path.exists(SEEN_IDS_FILE):
-        return set()
-    with open(SEEN_IDS_FILE, "r", encoding="utf-8") as f:
-        return set(line.strip() for line in f if line.strip())
+    return Ledger(SEEN_IDS_FILE, SEEN_IDS_TTL_DAYS)
 
 
-def save_seen_ids(ids_set):
-    with open(SEEN_IDS_FILE, "w", encoding="utf-8") as f:
-        f.write("\n".join(sorted(ids_set)) + "\n")
+def save_seen_ids(seen_ids):
+    seen_ids.commit()
 
 
-def fetch_latest_posts():
-    updates = bot.get_updates()
-    posts = [u.channel_post for u in updates if u.channel_post and u.channel_post.chat.username == CHANNEL_ID[1:]]
-    return list(reversed(posts[-15:])) if posts else []
+def load_update_offset():
+    if not os.path.exists(UPDATE_OFFSET_FILE):
+        return None
+    with open(UPDATE_OFFSET_FILE, "r", encoding="utf-8") as f:
+        value = f.read().strip()
+    return int(value) if value.isdigit() else None
 
 
-def hash_html_block(message_id, media_group_id=None):
-    key = f"{media_group_id or message_id}_{message_id}"
-    return hashlib.md5(key.encode()).hexdigest()
+def save_update_offset(offset):
+    with open(UPDATE_OFFSET_FILE, "w", encoding="utf-8") as f:
+        f.write(f"{offset}\n")
 
 
-def main():
-    posts = fetch_latest_posts()
-    if not posts:
-        print("Новых постов нет")
-        return
+def channel_posts(updates):
+    return [u.channel_post for u in updates if u.channel_post and u.channel_post.chat.username == CHANNEL_ID[1:]]
 
-    seen_ids = load_seen_ids()
-    new_ids = set()
-    seen_hashes = set()
-    fresh_news = []
-    os.makedirs("public", exist_ok=True)
 
-    if os.path.exists("public/news.html"):
-        with open("public/news.html", "r", encoding="utf-8") as f:
-            raw = f.read()
-            fresh_news = re.findall(r"<article class='news-item.*?>.*?</article>", raw, re.DOTALL)
-            for block in fresh_news:
-                post_id = re.search(r"id='post-(\d+)'", block)
-                if post_id:
-                    seen_hashes.add(hash_html_block(int(post_id.group(1))))
+@timed("fetch")
+def fetch_latest_posts():
+    # Одна страница с сохранённого update_id: запрос следующей страницы уже
+    # подтвердил бы Telegram первую, а её посты ещё не сохранены. Остальное —
+    # в следующем запуске.
+    offset = load_update_offset()
+    posts = []
+    updates = bot.get_updates(offset=offset, limit=UPDATES_PAGE, timeout=0, allowed_updates=["channel_post"])
+    if updates:
+        count("telegram_updates", len(updates))
+        if len(updates) == UPDATES_PAGE:
+            updates = hold_back_album(updates)
+        posts = channel_posts(updates)
+        offset = updates[-1].update_id + 1
+    return list(reversed(posts)), offset
+
+
+def hold_back_album(updates):
+    # Полная страница может оборваться посреди альбома: без хвоста он вышел бы
+    # неполным, а остаток потом пропустился бы как уже виденный. Хвостовой
+    # альбом оставляем целиком на следующий запуск
+    gid = getattr(updates[-1].channel_post, "media_group_id", None)
+    if not gid:
+        return updates
+    cut = len(updates)
+    while cut and getattr(updates[cut - 1].channel_post, "media_group_id", None) == gid:
+        cut -= 1
+    return updates[:cut] or updates
+
+
+def ack_updates(offset):
+    # Только запоминаем offset. Telegram забудет апдейты при следующем
+    # getUpdates(offset), т.е. в следующем запуске — уже после того, как
+    # хранилище и update_offset.txt закоммичены. Не запушилось — прочитаем снова.
+    if offset is None or offset == load_update_offset():
+        return
+    save_update_offset(offset)
 
-    fresh_news = move_to_archive(fresh_news)
-    cleanup_old_media()
 
+@timed("process")
+def process_posts(posts, store, seen_ids):
     grouped = {}
-    urgent = None
     for p in posts:
         key = getattr(p, "media_group_id", None) or p.message_id
         grouped.setdefault(str(key), []).append(p)
 
-    visible_count = sum(1 for b in fresh_news if "hidden" not in b)
-    any_new = False
-    new_cards = []
-
+    todo = []
+    urgent = []
     for gid, group in grouped.items():
         pid = str(gid)
+        if pid in seen_ids or pid in store:
+            continue
         first = group[0]
         last = group[-1]
-        if pid in seen_ids or pid in new_ids:
-            continue
-
         raw_cap = first.caption or ""
         raw_txt = last.text or ""
-        is_urg = "#срочно" in (raw_cap + raw_txt).lower()
-
-        if is_urg:
-            urgent = (last, first, len(group), pid)
-            continue
+        if "#срочно" in (raw_cap + raw_txt).lower():
+            urgent.append((pid, first, last, len(group), True))
+        else:
+            todo.append((pid, first, last, len(group), False))
+    todo += urgent
+
+    # Почти-дубли отсекаем до скачивания медиа и очереди ВК
+    dupes = near_dupes(store.values())
+    dropped = drop_near_dupes(dupes, [
+        (pid, last.date, last.message_id, clean_text(first.caption or "") + "\n" + clean_text(last.text or ""))
+        for pid, first, last, _, _ in todo
+    ])
+    for pid, same in dropped.items():
+        print(f"Похож на {same}: {pid} пропущен")
+        seen_ids.add(pid)
+    todo = [item for item in todo if item[0] not in dropped]
+
+    media = prefetch_media([last for _, _, last, _, _ in todo])
+    cards = {}
+    for pid, first, last, size, is_urg in todo:
+        cards[pid] = format_post(last, first.caption, size, is_urg, media.get(last.message_id))
+
+    # Карточки ссылаются на копии фото и постер — сохраняем их только после
+    # обработки, а то, что не получилось, убираем из разметки. Перекодирование
+    # не ждём: до готовности -web.mp4 карточка показывает исходник
+    with span("wait_media"):
+        wait_for_images()
+        wait_for_posters()
+    failed = settle_images()
+    failed.update(settle_videos())
+    for pid, first, last, size, is_urg in todo:
+        info = failed.get((cards[pid] or {}).get("media_path"))
+        if info:
+            print(f"Медиа {pid}: карточка без недоделанных копий")
+            cards[pid] = format_post(last, first.caption, size, is_urg, (None, info["src"]), info)
 
-        html, telegram_url, ct, tg_link = format_post(last, first.caption, len(group), False)
-        if not html:
+    new_cards = []
+    for pid, first, last, size, is_urg in todo:
+        card = cards[pid]
+        if not card:
             continue
 
-        html_hash = hash_html_block(last.message_id, gid if gid != str(last.message_id) else None)
-        if html_hash in seen_hashes:
-            continue
+        caption, text = clean_text(first.caption or ""), clean_text(last.text or "")
+        vk_media = pending_web(card["media_path"]) or card["media_path"]
+        enqueue_vk(hash_post_content(caption, text), caption, text, vk_media, card["content_type"], pid)
 
-        post_to_vk(clean_text(first.caption or ""), clean_text(last.text or ""), telegram_url, ct, pid)
-
-        new_cards.append((last.date, html))
-        new_ids.add(pid)
-        seen_hashes.add(html_hash)
-        any_new = True
-
-    if urgent:
-        html, telegram_url, ct, tg_link = format_post(urgent[0], urgent[1].caption, urgent[2], True)
-        if html:
-            post_to_vk(clean_text(urgent[1].caption or ""), clean_text(urgent[0].text or ""), telegram_url, ct, urgent[3])
-            html_hash = hash_html_block(urgent[0].message_id, urgent[3] if urgent[3] != str(urgent[0].message_id) else None)
-            new_cards.append((urgent[0].date, html))
-            new_ids.add(urgent[3])
-            seen_hashes.add(html_hash)
-            any_new = True
+        card["key"] = pid
+        new_cards.append(card)
+        if is_urg:
             print("СРОЧНО → ВК + сайт")
 
-    new_cards.sort(key=lambda x: x[0], reverse=True)
+    append_records(POSTS_STORE, new_cards)
+    index_cards(new_cards)
+    dupes.save()
+    # Виденными посты становятся только после записи в хранилище: упавшую
+    # пачку демон обработает заново
+    for card in new_cards:
+        seen_ids.add(card["key"])
+        store[card["key"]] = card
+        if card["media_path"]:
+            register_media(card["media_path"], card["key"])
+    return new_cards
+
+
+def publish(store, seen_ids):
+    cards = sorted_records(store)
+    with span("wait_media"):
+        wait_for_images()
+    save_media_manifest()
+    render_news(cards)
+    write_news_feed(cards)
+    save_seen_ids(seen_ids)
+    update_sitemap(cards)
+    generate_rss(cards)
+    changed = finish_build()
+    print(f"Изменено файлов сайта: {len(changed)}")
+
+
+def finish_transcodes(store, seen_ids, wait=False):
+    # Готовый -web.mp4 подменяет исходник в карточке, страницы пересобираются,
+    # исходник удаляется
+    done = transcoded(wait)
+    updated = []
+    for info in done:
+        for card in store.values():
+            if card.get("media_path") == info["orig"]:
+                card["html"] = card["html"].replace(info["orig"], info["src"])
+                card["media_path"] = info["src"]
+                replace_media(info["orig"], info["src"], card["key"])
+                updated.append(card)
+    if updated:
+        append_records(POSTS_STORE, updated)
+        publish(store, seen_ids)
+    for info in done:
+        remove_source(info)
+    return len(updated)
 
-    for _, html in new_cards:
-        if visible_count >= 12:
-            html = html.replace("class='news-item", "class='news-item hidden", 1)
-        fresh_news.insert(0, html)
-        visible_count += 1
 
-    if any_new or fresh_news:
-        with open("public/news.html", "w", encoding="utf-8") as f:
-            for b in fresh_news:
-                f.write(b + "\n")
-            if any("hidden" in b for b in fresh_news):
-                f.write('<button id="show-more" style="padding:10px 20px;background:#0077cc;color:#fff;border:none;border-radius:4px;cursor:pointer;margin:20px auto;display:block;">Показать ещё</button>\n')
-                f.write('<script>document.getElementById("show-more").onclick=()=>{document.querySelectorAll(".hidden").forEach(e=>e.classList.remove("hidden"));this.style.display="none"};</script>\n')
+def main():
+    posts, offset = fetch_latest_posts()
+    if not posts:
+        ack_updates(offset)
+        print("Новых постов нет")
+        return
+
+    seen_ids = load_seen_ids()
+    os.makedirs("public", exist_ok=True)
+
+    store = load_posts_store()
+    split_legacy_archive(extract_timestamp)
+    bootstrap_search(store.values())
+    move_to_archive(store)
+    cleanup_old_media()
+
+    new_cards = process_posts(posts, store, seen_ids)
+
+    if new_cards or store:
+        publish(store, seen_ids)
+        print(f"ГОТОВО! Добавлено новостей: {len(new_cards)} | Всего на главной: {len(store)} | ВК записей: {len(vk_posted())}")
+
+    # Перед деплоем карточки должны ссылаться на пережатые ролики
+    with span("wait_transcodes"):
+        finish_transcodes(store, seen_ids, wait=True)
+    ack_updates(offset)
 
-        save_seen_ids(seen_ids | new_ids)
-        update_sitemap()
-        generate_rss(fresh_news)
-        print(f"ГОТОВО! Добавлено новостей: {len(new_ids)} | Всего на главной: {len(fresh_news)} | ВК записей: {len(load_vk())}")
+
+def vk_worker():
+    while True:
+        try:
+            drain_outbox()
+        except Exception as e:
+            print(f"ВК очередь: {e}")
+        time.sleep(VK_DRAIN_INTERVAL)
+
+
+def flush_batch(posts, store, seen_ids):
+    # False — пачка не обработана: посты остаются в буфере до следующей попытки,
+    # Telegram их не подтвердил и отдаст снова даже после перезапуска
+    try:
+        new_cards = process_posts(list(reversed(posts)), store, seen_ids)
+        if new_cards:
+            publish(store, seen_ids)
+            print(f"Опубликовано: {len(new_cards)} | Всего на главной: {len(store)}")
+        return True
+    except Exception as e:
+        print(f"Ошибка обработки пачки: {e}")
+        return False
+
+
+def run_daemon():
+    # Состояние держим в памяти, сайт пересобираем, когда поток постов затих
+    # на DEBOUNCE_SECONDS (альбомы приходят пачкой), но не реже MAX_FLUSH_DELAY.
+    # offset — до него всё обработано и сохранено, read — до него всё прочитано.
+    # Пока в буфере есть посты, опрашиваем с offset: getUpdates с offset дальше
+    # подтвердил бы Telegram ещё не сохранённые посты. Повторно пришедшие
+    # апдейты отбрасываем по update_id
+    seen_ids = load_seen_ids()
+    os.makedirs("public", exist_ok=True)
+    store = load_posts_store()
+    split_legacy_archive(extract_timestamp)
+    bootstrap_search(store.values())
+    offset = read = load_update_offset()
+
+    if VK_TOKEN and VK_GROUP_ID:
+        threading.Thread(target=vk_worker, daemon=True).start()
+
+    buffered = []
+    first_buffered = last_buffered = retry_at = 0
+    last_archive = 0
+    print("Демон запущен")
+
+    try:
+        while True:
+            try:
+                updates = bot.get_updates(offset=offset, limit=UPDATES_PAGE,
+                                          timeout=1 if buffered else LONG_POLL_TIMEOUT,
+                                          allowed_updates=["channel_post"])
+            except Exception as e:
+                print(f"Ошибка getUpdates: {e}")
+                time.sleep(5)
+                continue
+
+            now = time.time()
+            fresh = [u for u in updates if read is None or u.update_id >= read]
+            if fresh:
+                read = fresh[-1].update_id + 1
+                posts = channel_posts(fresh)
+                if posts:
+                    if not buffered:
+                        first_buffered = now
+                    buffered += posts
+                    last_buffered = now
+
+            # Страница целиком из уже прочитанного — новое не влезет, пока не сбросим буфер
+            page_full = len(updates) == UPDATES_PAGE and not fresh
+            due = now - last_buffered >= DEBOUNCE_SECONDS or now - first_buffered >= MAX_FLUSH_DELAY or page_full
+            if buffered and due and now >= retry_at:
+                if flush_batch(buffered, store, seen_ids):
+                    buffered = []
+                    # Отчёт за каждую пачку, замеры следующей — с нуля
+                    print(f"Замеры: {summary(finish_run())}")
+                    start_run("news")
+                else:
+                    retry_at = now + FLUSH_RETRY
+            if not buffered:
+                # И чужие апдейты, и обработанная пачка: offset сохраняется на каждом опросе
+                offset = read
+                ack_updates(offset)
+
+            try:
+                if finish_transcodes(store, seen_ids):
+                    print("Карточки переведены на пережатые ролики")
+                if now - last_archive >= ARCHIVE_INTERVAL:
+                    if move_to_archive(store):
+                        publish(store, seen_ids)
+                    cleanup_old_media()
+                    last_archive = now
+            except Exception as e:
+                print(f"Ошибка обслуживания: {e}")
+    except KeyboardInterrupt:
+        # Ctrl-C в любом месте цикла: дописываем буфер и выходим
+        print("Остановка демона")
+        if buffered and flush_batch(buffered, store, seen_ids):
+            ack_updates(read)
+        finish_transcodes(store, seen_ids, wait=True)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    start_build("news")
+    start_run("vk" if "--vk" in sys.argv else "news")
+    if "--daemon" in sys.argv:
+        run_daemon()
+    elif "--vk" in sys.argv:
+        drain_outbox()
+    else:
+        main()
+    print(f"Замеры: {summary(finish_run())}")
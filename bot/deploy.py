@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+import json
+import hashlib
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+except ImportError:
+    boto3 = None
+
+# Деплой public/ в объектное хранилище по манифесту вместо aws s3 sync --delete.
+# deploy_manifest.json: путь -> md5, размер, тип, Cache-Control того, что уже
+# лежит в бакете. Заливаем новое и изменённое, удаляем только то, что было
+# в манифесте и пропало с диска; чужие объекты в бакете не трогаем.
+# Endpoint настраивается (S3_ENDPOINT), поэтому годится moto или MinIO.
+
+PUBLIC_DIR = "public"
+DEPLOY_MANIFEST = "deploy_manifest.json"
+S3_ENDPOINT = os.getenv("S3_ENDPOINT", "https://storage.yandexcloud.net")
+S3_BUCKET = os.getenv("S3_BUCKET", "newsforsvoi-backend")
+S3_REGION = os.getenv("S3_REGION", "ru-central1")
+DEPLOY_WORKERS = 8
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNK = 8 * 1024 * 1024
+HASH_CHUNK = 1024 * 1024
+
+# Медиа, названные по хешу содержимого (и их копии), не меняются никогда
+CONTENT_ADDRESSED = re.compile(r"^media/(photos|videos)/[0-9a-f]{32}(-[a-z0-9]+)?\.\w+$")
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_PAGES = "public, max-age=60"
+CACHE_STATIC = "public, max-age=3600"
+PAGE_EXTS = (".html", ".xml", ".json", ".atom", ".txt")
+EXTRA_TYPES = {".webp": "image/webp", ".avif": "image/avif", ".atom": "application/atom+xml",
+               ".json": "application/json", ".xml": "application/xml", ".js": "text/javascript"}
+SKIP = re.compile(r"(\.tmp|\.part(\.\w+)?)$")
+
+
+def load_deploy_manifest():
+    if not os.path.exists(DEPLOY_MANIFEST):
+        return {}
+    with open(DEPLOY_MANIFEST, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_deploy_manifest(manifest):
+    tmp = DEPLOY_MANIFEST + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, sort_keys=True, indent=0)
+    os.replace(tmp, DEPLOY_MANIFEST)
+
+
+def content_type(key):
+    ext = os.path.splitext(key)[1].lower()
+    ctype = EXTRA_TYPES.get(ext) or mimetypes.guess_type(key)[0] or "application/octet-stream"
+    if ctype.startswith("text/") or ctype in ("application/json", "application/xml", "application/atom+xml"):
+        ctype += "; charset=utf-8"
+    return ctype
+
+
+def cache_control(key):
+    if CONTENT_ADDRESSED.match(key):
+        return CACHE_IMMUTABLE
+    if key.endswith(PAGE_EXTS):
+        return CACHE_PAGES
+    return CACHE_STATIC
+
+
+def md5_file(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_public(known):
+    # Текущее состояние public/ в формате манифеста. Файлы с хешем в имени
+    # при том же размере не перечитываем — их содержимое не меняется.
+    files = {}
+    for root, _, names in os.walk(PUBLIC_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            key = os.path.relpath(path, PUBLIC_DIR).replace(os.sep, "/")
+            if SKIP.search(key):
+                continue
+            size = os.path.getsize(path)
+            old = known.get(key)
+            if old and old["size"] == size and CONTENT_ADDRESSED.match(key):
+                files[key] = old
+                continue
+            files[key] = {"md5": md5_file(path), "size": size,
+                          "type": content_type(key), "cache": cache_control(key)}
+    return files
+
+
+def s3_client(endpoint=None):
+    if boto3 is None:
+        raise RuntimeError("boto3 не установлен")
+    return boto3.client("s3", endpoint_url=endpoint or S3_ENDPOINT, region_name=S3_REGION)
+
+
+def upload(client, key, meta):
+    config = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_CHUNK,
+                            max_concurrency=4)
+    client.upload_file(os.path.join(PUBLIC_DIR, key), S3_BUCKET, key, Config=config, ExtraArgs={
+        "ACL": "public-read", "ContentType": meta["type"], "CacheControl": meta["cache"],
+    })
+
+
+def delete_keys(client, keys):
+    for i in range(0, len(keys), 1000):
+        batch = keys[i:i + 1000]
+        client.delete_objects(Bucket=S3_BUCKET, Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True})
+
+
+def bootstrap_from_bucket(client, files):
+    # Первый запуск: медиа, что уже лежат в бакете с тем же md5 (ETag), не
+    # перезаливаем; страницы маленькие — их зальём заново с нужными заголовками
+    known = {}
+    for page in client.get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET):
+        for obj in page.get("Contents", []):
+            meta = files.get(obj["Key"])
+            if meta and not obj["Key"].endswith(PAGE_EXTS) and obj["ETag"].strip('"') == meta["md5"]:
+                known[obj["Key"]] = meta
+    print(f"Деплой: в бакете уже есть {len(known)} файлов из {len(files)}")
+    return known
+
+
+def deploy(dry_run=False, client=None):
+    # client — готовый клиент S3 (тесты передают клиент moto)
+    manifest = load_deploy_manifest()
+    files = scan_public(manifest)
+    if client is None and not dry_run:
+        client = s3_client()
+    if not manifest and not dry_run:
+        manifest = bootstrap_from_bucket(client, files)
+
+    todo = sorted(k for k, meta in files.items() if manifest.get(k) != meta)
+    retired = sorted(k for k in manifest if k not in files)
+    print(f"Деплой: файлов {len(files)}, залить {len(todo)}, удалить {len(retired)}")
+    if dry_run:
+        for key in todo:
+            print(f"  + {key}")
+        for key in retired:
+            print(f"  - {key}")
+        return 0
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=DEPLOY_WORKERS) as pool:
+        futures = {key: pool.submit(upload, client, key, files[key]) for key in todo}
+        for key, future in futures.items():
+            try:
+                future.result()
+                manifest[key] = files[key]
+            except Exception as e:
+                failed += 1
+                print(f"Ошибка загрузки {key}: {e}")
+
+    if retired:
+        delete_keys(client, retired)
+        for key in retired:
+            del manifest[key]
+
+    save_deploy_manifest(manifest)
+    print(f"Деплой: залито {len(todo) - failed}, удалено {len(retired)}, ошибок {failed}")
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if deploy(dry_run="--dry-run" in sys.argv) else 0)
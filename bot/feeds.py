@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from render import Template
+from output import write_output
+
+# RSS 2.0 и Atom из записей постов, общие для новостей и истории.
+# Запись: {"id", "title", "link", "description", "ts", "category", "media"}.
+# XML каждого элемента кешируется по id и хешу записи, поэтому при
+# новом посте сериализуется только он. Даты в шапке берутся из самих
+# постов, поэтому без новых постов лента совпадает побайтно, не
+# переписывается (output.write_output) и ETag не меняется.
+
+SITE_URL = "https://newsforsvoi.ru"
+FEED_ITEMS = 20
+FEED_CACHE = "feed_cache_{}.json"
+MEDIA_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif",
+               ".webp": "image/webp", ".mp4": "video/mp4", ".webm": "video/webm"}
+
+RSS_ITEM = Template("""    <item>
+      <title>{{ title }}</title>
+      <link>{{ link }}</link>
+      <description>{{ description }}</description>
+      <pubDate>{{ date }}</pubDate>
+      <guid isPermaLink="{{ permalink }}">{{ id }}</guid>
+{% if category %}
+      <category>{{ category }}</category>
+{% endif %}
+{% if enclosure %}
+      <enclosure url="{{ enclosure.url }}" length="{{ enclosure.length }}" type="{{ enclosure.type }}" />
+{% endif %}
+    </item>
+""", "rss_item")
+
+RSS = Template("""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">
+  <channel>
+    <title>{{ title }}</title>
+    <link>{{ link }}</link>
+    <description>{{ description }}</description>
+    <language>ru</language>
+{% if updated %}
+    <lastBuildDate>{{ updated }}</lastBuildDate>
+{% endif %}
+    <atom:link href="{{ self_url }}" rel="self" type="application/rss+xml" />
+{% for i in items %}
+{{ i|safe }}{% endfor %}
+  </channel>
+</rss>
+""", "rss")
+
+ATOM_ENTRY = Template("""  <entry>
+    <title>{{ title }}</title>
+    <link href="{{ link }}" />
+    <id>{{ id }}</id>
+    <published>{{ date }}</published>
+    <updated>{{ date }}</updated>
+    <summary>{{ description }}</summary>
+{% if category %}
+    <category term="{{ category }}" />
+{% endif %}
+{% if enclosure %}
+    <link rel="enclosure" href="{{ enclosure.url }}" length="{{ enclosure.length }}" type="{{ enclosure.type }}" />
+{% endif %}
+  </entry>
+""", "atom_entry")
+
+ATOM = Template("""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="ru">
+  <title>{{ title }}</title>
+  <subtitle>{{ description }}</subtitle>
+  <link href="{{ link }}" />
+  <link rel="self" href="{{ self_url }}" />
+  <id>{{ link }}</id>
+  <updated>{{ updated }}</updated>
+  <author><name>Новости для Своих</name></author>
+{% for i in items %}
+{{ i|safe }}{% endfor %}
+</feed>
+""", "atom")
+
+
+def load_cache(name):
+    path = FEED_CACHE.format(name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(name, cache):
+    tmp = FEED_CACHE.format(name) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, sort_keys=True, indent=0)
+    os.replace(tmp, FEED_CACHE.format(name))
+
+
+def enclosure(media):
+    # Только свои файлы: длина берётся с диска, чужие ссылки без длины не пишем
+    if not media:
+        return None
+    path = media[len(SITE_URL):] if media.startswith(SITE_URL) else media
+    if path.startswith(("http://", "https://")):
+        return None
+    path = "/" + path.lstrip("/")
+    mime = MEDIA_TYPES.get(os.path.splitext(path)[1].lower())
+    if not mime or not os.path.exists("public" + path):
+        return None
+    return {"url": SITE_URL + path, "length": os.path.getsize("public" + path), "type": mime}
+
+
+def rfc822(ts):
+    return format_datetime(datetime.fromtimestamp(ts, timezone.utc), usegmt=True)
+
+
+def rfc3339(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def item_xml(cache, kind, item):
+    # Размер вложения входит в хеш: файл пережали или удалили — элемент пересобирается
+    ctx = dict(item, enclosure=enclosure(item.get("media")))
+    digest = hashlib.md5(json.dumps(ctx, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    hit = cache.setdefault(kind, {}).get(item["id"])
+    if hit and hit[0] == digest:
+        return hit[1]
+    if kind == "rss":
+        ctx["date"] = rfc822(item["ts"])
+        ctx["permalink"] = "true" if item["id"].startswith("http") else "false"
+        xml = RSS_ITEM.render(**ctx)
+    else:
+        ctx["date"] = rfc3339(item["ts"])
+        if not item["id"].startswith("http"):
+            ctx["id"] = f"tag:newsforsvoi.ru,2025:{item['id']}"
+        xml = ATOM_ENTRY.render(**ctx)
+    cache[kind][item["id"]] = [digest, xml]
+    return xml
+
+
+def write_feed(cache, rss_path, atom_path, channel, items):
+    # items уже отсортированы: новые сверху
+    items = items[:FEED_ITEMS]
+    newest = max((i["ts"] for i in items), default=0)
+    ctx = dict(channel, self_url=SITE_URL + "/" + os.path.relpath(rss_path, "public"))
+    rss = RSS.render(**ctx, updated=rfc822(newest) if newest else None,
+                     items=[item_xml(cache, "rss", i) for i in items])
+    ctx["self_url"] = SITE_URL + "/" + os.path.relpath(atom_path, "public")
+    atom = ATOM.render(**ctx, updated=rfc3339(newest),
+                       items=[item_xml(cache, "atom", i) for i in items])
+    return [p for p, data in [(rss_path, rss), (atom_path, atom)] if write_output(p, data)]
+
+
+def publish_feeds(name, feeds):
+    # feeds: [(rss_path, atom_path, channel, items)]; кеш общий на бота
+    cache = load_cache(name)
+    used = {}
+    changed = []
+    for rss_path, atom_path, channel, items in feeds:
+        changed += write_feed(cache, rss_path, atom_path, channel, items)
+        for i in items[:FEED_ITEMS]:
+            used[i["id"]] = True
+    # В кеше остаются только элементы, которые сейчас есть в лентах
+    for kind in cache:
+        cache[kind] = {k: v for k, v in cache[kind].items() if k in used}
+    save_cache(name, cache)
+    return changed
@@ -1,10 +1,18 @@
 import os
 import re
 import logging
+import hashlib
 from datetime import datetime
 from bs4 import BeautifulSoup
 import json
 
+from store import load_store, append_records, sorted_records
+from sitemap import write_urlset, SITEMAP_HISTORY
+from render import Template
+from feeds import publish_feeds
+from output import start_build, finish_build, write_output
+from metrics import start_run, finish_run, summary, span, timed, count
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -16,9 +24,22 @@ logging.basicConfig(
 )
 
 HISTORY_FILE = "public/history.html"
-SITEMAP_FILE = "public/sitemap.xml"
-RSS_FILE = "public/rss.xml"
+RSS_FILE = "public/history_rss.xml"
+ATOM_FILE = "public/history_atom.xml"
 POSTS_FILE = "bot/posts.txt"
+POSTS_JSONL = "bot/posts.jsonl"
+POSTS_REJECTED = "bot/posts.rejected"
+POSTS_BATCH = 200
+CURSOR_HEAD = 4096
+HISTORY_STORE = "history_store.jsonl"
+
+# Страницы «этот день в истории»: public/history/ММ-ДД.html,
+# на history.html — только последние FRONT_CARDS карточек,
+# остальное подгружается из public/history/feed-N.json (N=1 — самые старые)
+HISTORY_DIR = "public/history"
+HISTORY_INDEX_JSON = "public/history/index.json"
+FRONT_CARDS = 12
+FEED_PAGE = 12
 
 # === КОНФИГУРАЦИЯ ===
 DEFAULT_THUMBNAIL = "https://newsforsvoi.ru/media/default-history.jpg"
@@ -29,116 +50,260 @@ PAGE_URL = f"{SITE_URL}/history.html"
 THEME_TITLE = "История России и мира"
 THEME_DESC = "Что случилось в этот день"
 
-
-def load_posts():
-    if not os.path.exists(POSTS_FILE):
-        logging.warning(f"{POSTS_FILE} не найден, создаём пустой")
-        with open(POSTS_FILE, "w", encoding="utf-8") as f:
-            f.write("")
-        return []
-
+MONTHS_GEN = ["января", "февраля", "марта", "апреля", "мая", "июня",
+              "июля", "августа", "сентября", "октября", "ноября", "декабря"]
+
+CARD = Template("""<article class='news-item'>
+<span class='category-badge'>{{ badge }}</span>
+{% if photo %}
+<img src='{{ photo }}' alt='Фото события' class='news-image' style='display:block; max-width:100%; height:auto; margin:10px 0; border-radius:8px;'>
+{% endif %}
+{% if video %}
+<video controls src='{{ video }}' class='news-image'{% if poster %} poster='{{ poster }}'{% endif %}></video>
+{% endif %}
+<h3>{{ title }}</h3>
+<p class='news-text'>{{ text|br }}</p>
+<div class='timestamp' data-ts='{{ iso_time }}'>  {{ date }}</div>
+</article>
+""", "history_card")
+
+DAY_PAGE = Template("""<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<meta content="width=device-width, initial-scale=1.0" name="viewport">
+<title>{{ title }}</title>
+<link href="/style.css" rel="stylesheet">
+<link href="/favicon.ico" rel="icon" type="image/x-icon">
+<meta content="{{ title }}: исторические события России и мира." name="description">
+<link href="{{ url }}" rel="canonical">
+<meta content="{{ title }}" property="og:title">
+<meta content="{{ url }}" property="og:url">
+<meta content="https://newsforsvoi.ru/pushkin-portrait.jpg" property="og:image">
+<script id="schema-org" type="application/ld+json">{{ schema|json }}</script>
+</head>
+<body>
+<header class="history-header">
+<div class="history-header-content">
+<img alt="Пушкин" class="portrait" src="/pushkin-portrait.jpg">
+<div class="quote-block">
+<h1>{{ title }}</h1>
+</div>
+</div>
+<div class="button-bar">
+<a class="button" href="/history.html">Вся история</a>
+<a class="button" href="/">На главную</a>
+</div>
+</header>
+<main>
+<section id="history-feed">
+<div class="news-grid" id="history-container">
+{% for c in cards %}
+{{ c|safe }}
+{% endfor %}
+</div>
+</section>
+</main>
+<footer>
+  © 2025 Новости для Своих | <a href="https://t.me/Artstah">@Artstah</a>
+</footer>
+</body>
+</html>
+""", "history_day")
+
+
+# === ВХОДНЫЕ ПОСТЫ ===
+# posts.txt — записи "ПОЛЕ: значение", разделённые строкой "---";
+# posts.jsonl — по объекту на строку с теми же полями в нижнем регистре.
+# Прочитанное место хранится в <файл>.pos: записи до него уже в хранилище,
+# сам файл очищается, только когда дочитан до конца.
+FIELDS = {
+    "TITLE": "title",
+    "TEXT": "text",
+    "TIME": "iso_time",
+    "DATE": "date",
+    "MEDIA_URL": "media_url",
+    "MEDIA_TYPE": "media_type",
+    "THUMBNAIL": "thumbnail",
+}
+MULTILINE_FIELDS = ["title", "text"]
+MEDIA_TYPES = ["", "photo", "image", "video"]
+FIELD_RE = re.compile(r"^([A-Z_]+):[ \t]?(.*)$")
+
+
+def write_file(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def head_digest(path, offset):
+    # Отпечаток уже прочитанной части: дописывание в конец его не меняет,
+    # замена файла целиком — меняет. Номер inode не годится: checkout в CI
+    # каждый раз создаёт файл заново
+    with open(path, "rb") as f:
+        data = f.read(min(offset, CURSOR_HEAD))
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def load_cursor(path):
     try:
-        with open(POSTS_FILE, "r", encoding="utf-8") as f:
-            content = f.read()
-        if not content.strip():
-            return []
-
-        posts = []
-        raw_posts = [p.strip() for p in re.split(r"\n?---\n?", content) if p.strip()]
-
-        for post_text in raw_posts:
-            post = {
-                "title": f"{THEME_DESC}: Историческое событие",
-                "text": "",
-                "iso_time": datetime.now().strftime("%Y-%m-%dT%H:%M:%S+03:00"),
-                "date": datetime.now().strftime("%d.%m.%Y %H:%M"),
-                "media_url": "",
-                "media_type": "",
-                "thumbnail": DEFAULT_THUMBNAIL
-            }
-
-            lines = post_text.split("\n")
-            current_field = None
-            field_lines = []
-
-            for line in lines:
-                line = line.rstrip()
-
-                if line.startswith("TITLE:"):
-                    if current_field and current_field != "title":
-                        post[current_field] = "\n".join(field_lines).strip()
-                    current_field = "title"
-                    field_lines = [line[7:].strip()]
-
-                elif line.startswith("TEXT:"):
-                    if current_field and current_field != "text":
-                        post[current_field] = "\n".join(field_lines).strip()
-                    current_field = "text"
-                    field_lines = [line[6:].strip()]
-
-                elif line.startswith("TIME:"):
-                    if current_field:
-                        post[current_field] = "\n".join(field_lines).strip()
-                    post["iso_time"] = line[6:].strip()
-                    current_field = None
-
-                elif line.startswith("DATE:"):
-                    if current_field:
-                        post[current_field] = "\n".join(field_lines).strip()
-                    post["date"] = line[6:].strip()
-                    current_field = None
-
-                elif line.startswith("MEDIA_URL:"):
-                    if current_field:
-                        post[current_field] = "\n".join(field_lines).strip()
-                    post["media_url"] = line[11:].strip()
-                    current_field = None
-
-                elif line.startswith("MEDIA_TYPE:"):
-                    if current_field:
-                        post[current_field] = "\n".join(field_lines).strip()
-                    post["media_type"] = line[12:].strip().lower()
-                    current_field = None
-
-                elif line.startswith("THUMBNAIL:"):
-                    if current_field:
-                        post[current_field] = "\n".join(field_lines).strip()
-                    post["thumbnail"] = line[10:].strip()
-                    current_field = None
-
-                elif current_field:
-                    field_lines.append(line)
-
-            if current_field:
-                post[current_field] = "\n".join(field_lines).strip()
-
-            if not post["title"] and not post["text"]:
-                continue
+        with open(path + ".pos", "r", encoding="utf-8") as f:
+            parts = f.read().split()
+        offset = int(parts[0]) if parts else 0
+    except (OSError, ValueError):
+        return 0
+    # Файл заменили целиком — читаем сначала, дубли отсеет ключ поста
+    if offset > os.path.getsize(path):
+        return 0
+    if len(parts) > 1 and parts[1] != head_digest(path, offset):
+        logging.info(f"{path} заменён — читаю сначала")
+        return 0
+    return offset
+
+
+def save_cursor(path, offset):
+    if offset >= os.path.getsize(path):
+        # Всё прочитано: очищаем файл и забываем позицию
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("")
+        if os.path.exists(path + ".pos"):
+            os.remove(path + ".pos")
+        logging.info(f"{path} очищен")
+        return
+    write_file(path + ".pos", f"{offset} {head_digest(path, offset)}")
 
-            if post["media_type"] in ["photo", "image"] and post["media_url"]:
-                post["thumbnail"] = post["media_url"]
 
-            posts.append(post)
+def reject(path, lineno, raw, error):
+    logging.error(f"{path}:{lineno}: запись пропущена — {error}")
+    with open(POSTS_REJECTED, "a", encoding="utf-8") as f:
+        f.write(f"# {path}:{lineno}: {error}\n{raw.rstrip()}\n---\n")
 
-        return posts
 
-    except Exception as e:
-        logging.error(f"Ошибка чтения {POSTS_FILE}: {e}")
-        return []
+def new_post():
+    return {
+        "title": f"{THEME_DESC}: Историческое событие",
+        "text": "",
+        "iso_time": "",
+        "date": datetime.now().strftime("%d.%m.%Y %H:%M"),
+        "media_url": "",
+        "media_type": "",
+        "thumbnail": DEFAULT_THUMBNAIL
+    }
 
 
-def save_posts():
+def finish_post(post):
+    # Возвращает пост или None для пустой записи; ошибки — ValueError
+    post["media_type"] = post["media_type"].lower()
+    # Ключ — только из того, что есть в записи: время по умолчанию при
+    # повторном чтении той же записи было бы другим
+    post["key"] = post_key(post)
+    if not post["iso_time"]:
+        post["iso_time"] = datetime.now().strftime("%Y-%m-%dT%H:%M:%S+03:00")
+    if post["media_type"] not in MEDIA_TYPES:
+        raise ValueError(f"неизвестный MEDIA_TYPE {post['media_type']!r}")
     try:
-        with open(POSTS_FILE, "w", encoding="utf-8") as f:
-            f.write("")
-        logging.info(f"{POSTS_FILE} очищен")
-    except Exception as e:
-        logging.error(f"Ошибка записи {POSTS_FILE}: {e}")
-
-
+        datetime.fromisoformat(post["iso_time"].replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"TIME не в формате ISO: {post['iso_time']!r}")
+    if not post["title"] and not post["text"]:
+        return None
+    if post["media_type"] in ["photo", "image"] and post["media_url"]:
+        post["thumbnail"] = post["media_url"]
+    return post
+
+
+def parse_text_record(lines):
+    post = new_post()
+    current = None
+    for line in lines:
+        m = FIELD_RE.match(line)
+        if m and m.group(1) in FIELDS:
+            current = FIELDS[m.group(1)]
+            post[current] = m.group(2).strip()
+            if current not in MULTILINE_FIELDS:
+                current = None
+        elif current:
+            post[current] += "\n" + line
+        elif line.strip():
+            raise ValueError(f"строка вне поля: {line[:40]!r}")
+    for field in MULTILINE_FIELDS:
+        post[field] = post[field].strip()
+    return finish_post(post)
+
+
+def parse_json_record(line):
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("ожидался JSON-объект")
+    unknown = set(data) - set(FIELDS.values())
+    if unknown:
+        raise ValueError(f"неизвестные поля {sorted(unknown)}")
+    post = new_post()
+    for field, value in data.items():
+        if not isinstance(value, str):
+            raise ValueError(f"поле {field} должно быть строкой")
+        post[field] = value.strip()
+    return finish_post(post)
+
+
+def text_records(f):
+    # (смещение конца записи, номер первой строки, строки записи)
+    lines, start, lineno = [], 1, 0
+    for raw in iter(f.readline, b""):
+        lineno += 1
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        if line.strip() == "---":
+            if lines:
+                yield f.tell(), start, lines
+            lines, start = [], lineno + 1
+        else:
+            lines.append(line.rstrip())
+    if lines:
+        yield f.tell(), start, lines
+
+
+def json_records(f):
+    lineno = 0
+    for raw in iter(f.readline, b""):
+        lineno += 1
+        line = raw.decode("utf-8", errors="replace").strip()
+        if line:
+            yield f.tell(), lineno, line
+
+
+def iter_posts(path):
+    # Потоково отдаёт (смещение, пост); битые записи уходят в POSTS_REJECTED
+    if not os.path.exists(path):
+        return
+    is_json = path.endswith(".jsonl")
+    with open(path, "rb") as f:
+        f.seek(load_cursor(path))
+        records = json_records(f) if is_json else text_records(f)
+        for offset, lineno, raw in records:
+            try:
+                post = parse_json_record(raw) if is_json else parse_text_record(raw)
+            except ValueError as e:
+                reject(path, lineno, raw if is_json else "\n".join(raw), e)
+                post = None
+            yield offset, post
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@timed("format_post")
 def format_post(post):
     title = post.get("title", f"{THEME_DESC}: Историческое событие")
-    text = post.get("text", "").replace("\n", "<br>")
     iso_time = post.get("iso_time", datetime.now().strftime("%Y-%m-%dT%H:%M:%S+03:00"))
     formatted_time = post.get("date", datetime.now().strftime("%d.%m.%Y %H:%M"))
     media_url = post.get("media_url", "")
@@ -146,20 +311,15 @@ def format_post(post):
     thumbnail = post.get("thumbnail", DEFAULT_THUMBNAIL)
 
     # === ГЕНЕРАЦИЯ КАРТОЧКИ С <h3> ===
-    html = "<article class='news-item'>\n"
-    html += f"<span class='category-badge'>{THEME_TITLE}</span>\n"
-
-    if media_url and media_type in ["photo", "image"]:
-        html += f"<img src='{media_url}' alt='Фото события' class='news-image' style='display:block; max-width:100%; height:auto; margin:10px 0; border-radius:8px;'>\n"
-    elif media_url and media_type == "video":
-        poster = thumbnail if thumbnail != DEFAULT_THUMBNAIL else ""
-        poster_attr = f" poster='{poster}'" if poster else ""
-        html += f"<video controls src='{media_url}' class='news-image'{poster_attr}></video>\n"
-
-    html += f"<h3>{title}</h3>\n"  # ← КЛЮЧЕВОЕ ИСПРАВЛЕНИЕ
-    html += f"<p class='news-text'>{text}</p>\n"
-    html += f"<div class='timestamp' data-ts='{iso_time}'>  {formatted_time}</div>\n"
-    html += "</article>\n"
+    is_photo = media_url and media_type in ["photo", "image"]
+    is_video = media_url and media_type == "video"
+    html = CARD.render(
+        badge=THEME_TITLE, title=title, text=post.get("text", ""),
+        iso_time=iso_time, date=formatted_time,
+        photo=media_url if is_photo else None,
+        video=media_url if is_video else None,
+        poster=thumbnail if thumbnail != DEFAULT_THUMBNAIL else None,
+    )
 
     # === JSON-LD ===
     json_ld_article = {
@@ -211,24 +371,119 @@ def format_post(post):
     return html, json_ld_article
 
 
-def update_history_html(html, json_ld_article):
-    os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+def post_key(post):
+    raw = f"{post.get('iso_time', '')}|{post.get('title', '')}|{post.get('text', '')}"
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
 
-    if not os.path.exists(HISTORY_FILE):
-        logging.error(f"{HISTORY_FILE} НЕ НАЙДЕН! Создай его вручную с <div id=\"history-container\">")
-        return
 
+def parse_ts(iso_time):
     try:
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            soup = BeautifulSoup(f, "html.parser")
-    except Exception as e:
-        logging.error(f"Ошибка чтения {HISTORY_FILE}: {e}")
-        return
+        return int(datetime.fromisoformat(iso_time.replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return 0
+
+
+def make_record(post, html):
+    return {
+        "key": post.get("key") or post_key(post),
+        "ts": parse_ts(post.get("iso_time", "")),
+        "iso_time": post.get("iso_time", ""),
+        "date": post.get("date", ""),
+        "title": post.get("title", ""),
+        "text": post.get("text", ""),
+        "media_url": post.get("media_url", ""),
+        "media_type": post.get("media_type", ""),
+        "thumbnail": post.get("thumbnail", DEFAULT_THUMBNAIL),
+        "html": html,
+    }
+
+
+def import_history_html(soup):
+    # Разовый перенос карточек из history.html в хранилище
+    container = soup.find("div", id="history-container")
+    if not container:
+        return []
+    records = []
+    for item in container.find_all("article", class_="news-item"):
+        title_tag = item.find("h3") or item.find(class_="news-title")
+        text_tag = item.find(class_="news-text")
+        timestamp = item.find(class_="timestamp")
+        media_tag = item.find("img") or item.find("video")
+        text = ""
+        if text_tag:
+            text = "".join("\n" if getattr(c, "name", None) == "br" else c.get_text() if c.name else str(c)
+                           for c in text_tag.children)
+        post = {
+            "title": title_tag.get_text(strip=True) if title_tag else f"{THEME_DESC}: Историческое событие",
+            "text": text.strip(),
+            "iso_time": timestamp.get("data-ts", "") if timestamp else "",
+            "date": timestamp.get_text(strip=True) if timestamp else "",
+            "media_url": media_tag.get("src", "") if media_tag else "",
+            "media_type": ("video" if media_tag.name == "video" else "photo") if media_tag else "",
+            "thumbnail": media_tag.get("poster", DEFAULT_THUMBNAIL) if media_tag else DEFAULT_THUMBNAIL,
+        }
+        records.append(make_record(post, str(item) + "\n"))
+    logging.info(f"Импортировано из history.html: {len(records)} карточек")
+    return records
+
+
+@timed("load_store")
+def load_history_store(soup=None):
+    if not os.path.exists(HISTORY_STORE) and os.path.exists(HISTORY_FILE):
+        if soup is None:
+            with open(HISTORY_FILE, "r", encoding="utf-8") as f:
+                soup = BeautifulSoup(f, "html.parser")
+        append_records(HISTORY_STORE, import_history_html(soup))
+    records, _ = load_store(HISTORY_STORE)
+    return records
+
+
+def schema_page(name, url, recs):
+    # ItemList только из карточек этой страницы, позиции — при рендере
+    items = []
+    for i, rec in enumerate(recs, 1):
+        _, json_ld = format_post(rec)
+        items.append({"@type": "ListItem", "position": i, "item": json_ld})
+    return {
+        "@context": "https://schema.org",
+        "@type": "WebPage",
+        "name": name,
+        "description": "Исторические события за последние дни — отражение прошлого для настоящего.",
+        "url": url,
+        "publisher": {
+            "@type": "Organization",
+            "name": "Новости для Своих",
+            "logo": {"@type": "ImageObject", "url": "https://newsforsvoi.ru/pushkin-portrait.jpg", "width": 1200, "height": 630}
+        },
+        "mainEntity": {"@type": "ItemList", "itemListElement": items}
+    }
+
+
+def dump_schema(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
 
+
+def day_of(rec):
+    # "ММ-ДД" даты публикации; по ней же фильтровал старый поиск по дате
+    iso = rec.get("iso_time", "")
+    return iso[5:10] if len(iso) >= 10 else ""
+
+
+def day_title(day):
+    month, dd = day.split("-")
+    return f"{int(dd)} {MONTHS_GEN[int(month) - 1]}"
+
+
+def card_html(rec):
+    return rec["html"].strip().replace("<article", f"<article data-key=\"{rec['key']}\"", 1) + "\n"
+
+
+def update_history_html(soup, records, pages):
+    # Первая страница ленты: последние FRONT_CARDS карточек из хранилища
     container = soup.find("div", id="history-container")
     if not container:
         logging.error("Контейнер #history-container не найден в history.html")
-        return
+        return False
 
     # === ОЧИСТКА void-тегов от /> ===
     for tag in soup.find_all(['meta', 'link', 'img', 'input', 'br', 'hr']):
@@ -236,153 +491,177 @@ def update_history_html(html, json_ld_article):
             tag.name = tag.name
             tag.append('')
 
-    container.insert(0, BeautifulSoup(html, "html.parser"))
+    front = sorted_records(records)[:FRONT_CARDS]
+    container.clear()
+    container.append(BeautifulSoup("".join(card_html(rec) for rec in front), "html.parser"))
+    container["data-pages"] = str(pages)
 
     # === JSON-LD ===
     schema_script = soup.find("script", id="schema-org")
     if not schema_script:
         schema_script = soup.new_tag("script", type="application/ld+json", id="schema-org")
         soup.head.append(schema_script)
+    schema_script.string = dump_schema(schema_page("История для Своих — события прошлых дней", PAGE_URL, front))
 
     try:
-        schema_data = json.loads(schema_script.string or "{}") if schema_script.string else {
-            "@context": "https://schema.org",
-            "@type": "WebPage",
-            "name": "История для Своих — события прошлых дней",
-            "description": "Исторические события за последние дни — отражение прошлого для настоящего.",
-            "url": PAGE_URL,
-            "publisher": {
-                "@type": "Organization",
-                "name": "Новости для Своих",
-                "logo": {"@type": "ImageObject", "url": "https://newsforsvoi.ru/pushkin-portrait.jpg", "width": 1200, "height": 630}
-            },
-            "mainEntity": {"@type": "ItemList", "itemListElement": []}
-        }
-
-        items = schema_data["mainEntity"]["itemListElement"]
-        for item in items:
-            if "position" in item:
-                item["position"] += 1
-
-        items.insert(0, {
-            "@type": "ListItem",
-            "position": 1,
-            "item": json_ld_article
-        })
-
-        schema_script.string = json.dumps(schema_data, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"Ошибка JSON-LD: {e}")
-
-    try:
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            f.write(str(soup))
-        logging.info("history.html обновлён")
+        write_output(HISTORY_FILE, str(soup))
+        logging.info(f"history.html обновлён: {len(front)} карточек, страниц ленты {pages}")
+        return True
     except Exception as e:
         logging.error(f"Ошибка записи {HISTORY_FILE}: {e}")
-
-
-def generate_sitemap():
-    lastmod = datetime.now().strftime("%Y-%m-%d")
-    sitemap = f"""<?xml version="1.0" encoding="UTF-8"?>
-<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-  <url>
-    <loc>{PAGE_URL}</loc>
-    <lastmod>{lastmod}</lastmod>
-    <changefreq>daily</changefreq>
-    <priority>0.8</priority>
-  </url>
-</urlset>
-"""
-    os.makedirs(os.path.dirname(SITEMAP_FILE), exist_ok=True)
-    with open(SITEMAP_FILE, "w", encoding="utf-8") as f:
-        f.write(sitemap.strip())
-    logging.info(f"Sitemap обновлён: {SITEMAP_FILE}")
-
-
-def generate_rss():
-    try:
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            soup = BeautifulSoup(f, "html.parser")
-
-        items = soup.find_all("article", class_="news-item")[:20]
-        last_build = datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0300")
-
-        rss = f'''<?xml version="1.0" encoding="UTF-8"?>
-<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">
-  <channel>
-    <title>{THEME_TITLE} — {THEME_DESC}</title>
-    <link>{PAGE_URL}</link>
-    <description>Исторические события России и мира: что случилось в этот день.</description>
-    <language>ru</language>
-    <lastBuildDate>{last_build}</lastBuildDate>
-    <atom:link href="{SITE_URL}/rss.xml" rel="self" type="application/rss+xml" />
-'''
-
-        for item in items:
-            title_tag = item.find("h3") or item.find(class_="news-title")
-            title = title_tag.get_text(strip=True) if title_tag else f"{THEME_DESC}: Историческое событие"
-            desc_tag = item.find(class_="news-text")
-            description = desc_tag.get_text(separator=" ", strip=True)[:500] if desc_tag else ""
-            timestamp = item.find(class_="timestamp")
-            pub_date = timestamp["data-ts"] if timestamp and "data-ts" in timestamp.attrs else datetime.now().isoformat()
-            pub_date_rss = datetime.fromisoformat(pub_date.replace("Z", "+00:00")).astimezone().strftime("%a, %d %b %Y %H:%M:%S %z")
-
-            media_tag = item.find("img") or item.find("video")
-            enclosure = ""
-            if media_tag:
-                src = media_tag["src"]
-                if src.endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                    enclosure = f'<enclosure url="{src}" length="0" type="image/jpeg" />'
-                elif src.endswith(('.mp4', '.webm')):
-                    enclosure = f'<enclosure url="{src}" length="0" type="video/mp4" />'
-
-            rss += f'''
-    <item>
-      <title>{title}</title>
-      <link>{PAGE_URL}</link>
-      <description><![CDATA[{description}]]></description>
-      <pubDate>{pub_date_rss}</pubDate>
-      <guid isPermaLink="false">history-{pub_date}</guid>
-      {enclosure}
-    </item>'''
-
-        rss += '''
-  </channel>
-</rss>'''
-
-        os.makedirs(os.path.dirname(RSS_FILE), exist_ok=True)
-        with open(RSS_FILE, "w", encoding="utf-8") as f:
-            f.write(rss)
-        logging.info(f"RSS обновлён: {RSS_FILE}")
-
-    except Exception as e:
-        logging.error(f"Ошибка генерации RSS: {e}")
+        return False
+
+
+def load_history_index():
+    if not os.path.exists(HISTORY_INDEX_JSON):
+        return None
+    with open(HISTORY_INDEX_JSON, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def day_page(day, recs):
+    title = f"Этот день в истории — {day_title(day)}"
+    url = f"{SITE_URL}/history/{day}.html"
+    return DAY_PAGE.render(title=title, url=url, schema=schema_page(title, url, recs),
+                           cards=[card_html(rec) for rec in recs])
+
+
+@timed("day_pages")
+def write_day_pages(records, days=None):
+    # days=None — переписать все; иначе только дни, куда попали новые посты
+    by_day = {}
+    for rec in sorted_records(records):
+        day = day_of(rec)
+        if day:
+            by_day.setdefault(day, []).append(rec)
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    for day in (by_day if days is None else days & by_day.keys()):
+        write_output(os.path.join(HISTORY_DIR, f"{day}.html"), day_page(day, by_day[day]))
+    index = {day: len(recs) for day, recs in by_day.items()}
+    write_output(HISTORY_INDEX_JSON, json.dumps(index, ensure_ascii=False, sort_keys=True, indent=0))
+    logging.info(f"Страниц по дням: {len(index)}, переписано: {len(by_day) if days is None else len(days)}")
+    return by_day
+
+
+@timed("feed_pages")
+def write_feed(records, since_ts=None):
+    # Страницы считаются от самых старых, поэтому новый пост меняет только последнюю
+    ordered = sorted_records(records, reverse=False)
+    pages = (len(ordered) + FEED_PAGE - 1) // FEED_PAGE
+    first = 0
+    if since_ts is not None:
+        first = next((i for i, rec in enumerate(ordered) if rec["ts"] >= since_ts), len(ordered)) // FEED_PAGE
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    for n in range(first, pages):
+        chunk = ordered[n * FEED_PAGE:(n + 1) * FEED_PAGE]
+        data = {"page": n + 1, "cards": [{"key": rec["key"], "html": card_html(rec)} for rec in reversed(chunk)]}
+        write_output(os.path.join(HISTORY_DIR, f"feed-{n + 1}.json"), json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    return pages
+
+
+@timed("sitemap")
+def generate_sitemap(by_day):
+    # lastmod — дата свежего поста на странице, а не время запуска
+    days = {day: recs[0]["iso_time"][:10] for day, recs in by_day.items()}
+    urls = [("/history.html", max(days.values(), default=None), "daily", "0.8")]
+    for day in sorted(days):
+        urls.append((f"/history/{day}.html", days[day], "yearly", "0.6"))
+    if write_urlset(SITEMAP_HISTORY, urls):
+        logging.info(f"Sitemap обновлён: {SITEMAP_HISTORY}")
+
+
+@timed("feeds")
+def generate_rss(records):
+    items = []
+    for rec in sorted_records(records):
+        if not rec["ts"]:
+            continue
+        day = day_of(rec)
+        items.append({
+            "id": f"history-{rec['key']}",
+            "title": rec["title"] or f"{THEME_DESC}: Историческое событие",
+            "link": f"{SITE_URL}/history/{day}.html" if day else PAGE_URL,
+            "description": " ".join(rec["text"].split())[:500],
+            "ts": rec["ts"],
+            "category": THEME_TITLE,
+            "media": rec["media_url"],
+        })
+    channel = {"title": f"{THEME_TITLE} — {THEME_DESC}", "link": PAGE_URL,
+               "description": "Исторические события России и мира: что случилось в этот день."}
+    changed = publish_feeds("history", [(RSS_FILE, ATOM_FILE, channel, items)])
+    logging.info(f"RSS/Atom обновлены: {len(changed)} файлов")
 
 
 def main():
-    posts = load_posts()
-    if not posts:
+    if not os.path.exists(POSTS_FILE):
+        logging.warning(f"{POSTS_FILE} не найден, создаём пустой")
+        with open(POSTS_FILE, "w", encoding="utf-8") as f:
+            f.write("")
+
+    soup = None
+    if os.path.exists(HISTORY_FILE):
+        # Документ разбираем один раз на весь запуск
+        try:
+            with span("parse_html"), open(HISTORY_FILE, "r", encoding="utf-8") as f:
+                soup = BeautifulSoup(f, "html.parser")
+        except Exception as e:
+            logging.error(f"Ошибка чтения {HISTORY_FILE}: {e}")
+            return
+    records = load_history_store(soup)
+
+    new_records = []
+    for path in [POSTS_FILE, POSTS_JSONL]:
+        for batch in batches(iter_posts(path), POSTS_BATCH):
+            if soup is None:
+                logging.error(f"{HISTORY_FILE} НЕ НАЙДЕН! Создай его вручную с <div id=\"history-container\">")
+                return
+            added = []
+            for _, post in batch:
+                if post is None:
+                    continue
+                html, json_ld = format_post(post)
+                if not html or not json_ld:
+                    continue
+                key = post["key"]
+                if key in records:
+                    logging.info(f"Уже опубликован: {post['title']}")
+                    continue
+                records[key] = make_record(post, html)
+                added.append(records[key])
+                logging.info(f"Добавлен пост: {post['title']}")
+            # Сначала хранилище, потом отметка о прочитанном: при сбое между
+            # ними запись прочитается ещё раз и отсеется по ключу
+            append_records(HISTORY_STORE, added)
+            save_cursor(path, batch[-1][0])
+            count("posts_added", len(added))
+            new_records += added
+    if not new_records:
         logging.info("Новых постов нет")
-        generate_sitemap()
-        generate_rss()
-        return
 
-    for post in posts:
-        html, json_ld = format_post(post)
-        if html and json_ld:
-            update_history_html(html, json_ld)
-            logging.info(f"Добавлен пост: {post['title']}")
+    first_run = load_history_index() is None
+    if soup is not None and (new_records or first_run):
+        since = None if first_run else min(rec["ts"] for rec in new_records)
+        days = None if first_run else {day_of(rec) for rec in new_records}
+        by_day = write_day_pages(records, days)
+        pages = write_feed(records, since)
+        with span("front_page"):
+            update_history_html(soup, records, pages)
+    else:
+        by_day = write_day_pages(records, set())
 
-    save_posts()
-    generate_sitemap()
-    generate_rss()
+    generate_sitemap(by_day)
+    generate_rss(records)
+    changed = finish_build()
+    logging.info(f"Изменено файлов сайта: {len(changed)}")
 
 
 # === ТОЛЬКО РУЧНОЙ ЗАПУСК ===
 if __name__ == "__main__":
     logging.info("Запуск обработки постов (ручной режим)")
+    start_build("history")
+    start_run("history")
     try:
         main()
     except Exception as e:
-        logging.error(f"Критическая ошибка: {e}")
\ No newline at end of file
+        logging.error(f"Критическая ошибка: {e}")
+    logging.info(f"Замеры: {summary(finish_run())}")
\ No newline at end of file
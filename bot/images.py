@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from render import Template
+from output import note_changed
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+# Уменьшенные копии фото для srcset: WebP (и AVIF по желанию) без метаданных.
+# Имена производные от имени оригинала, а он уже назван по хешу содержимого.
+IMAGE_WIDTHS = [320, 640, 1080]
+IMAGE_QUALITY = 80
+IMAGE_SIZES = "(max-width: 800px) 100vw, 800px"
+IMAGE_WORKERS = 2
+IMAGE_FORMATS = [("webp", "image/webp")]
+if Image and os.getenv("MEDIA_AVIF") == "1" and features.check("avif"):
+    IMAGE_FORMATS.insert(0, ("avif", "image/avif"))
+
+PICTURE = Template("""{% if info %}
+<picture>
+{% for s in sources %}
+  <source type="{{ s.mime }}" srcset="{{ s.srcset }}" sizes="{{ sizes }}">
+{% endfor %}
+  <img src="{{ src }}" alt="{{ alt }}" width="{{ info.width }}" height="{{ info.height }}" loading="lazy" decoding="async">
+</picture>
+{% else %}
+<img src="{{ src }}" alt="{{ alt }}" loading="lazy">
+{% endif %}
+""", "picture")
+
+pool = [None]
+jobs = []
+planned = set()
+pending = []
+
+
+def variant_path(media_path, width, ext):
+    stem = os.path.splitext(media_path)[0]
+    return f"{stem}-{width}.{ext}"
+
+
+def render_variants(src, variants):
+    # Выполняется в отдельном процессе
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGB")
+        for width, ext, dst in variants:
+            if os.path.exists(dst):
+                continue
+            height = round(im.height * width / im.width)
+            tmp = dst + ".part"
+            try:
+                im.resize((width, height), Image.LANCZOS).save(tmp, format=ext.upper(), quality=IMAGE_QUALITY)
+                os.replace(tmp, dst)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+    return len(variants)
+
+
+def plan_image(media_path):
+    # Размеры оригинала и список копий; сами копии делает пул процессов
+    if not Image or not media_path or not media_path.startswith("/media/"):
+        return None
+    src = "public" + media_path
+    try:
+        with Image.open(src) as im:
+            width, height = im.size
+            if im.getexif().get(0x0112) in (5, 6, 7, 8):
+                width, height = height, width
+    except Exception as e:
+        print(f"Не удалось прочитать фото {src}: {e}")
+        return None
+
+    widths = [w for w in IMAGE_WIDTHS if w < width] + [min(width, IMAGE_WIDTHS[-1])]
+    widths = sorted(set(widths))
+    sources = []
+    todo = []
+    for ext, mime in IMAGE_FORMATS:
+        srcset = []
+        for w in widths:
+            path = variant_path(media_path, w, ext)
+            srcset.append(f"{path} {w}w")
+            if path not in planned and not os.path.exists("public" + path):
+                planned.add(path)
+                todo.append((w, ext, "public" + path))
+        sources.append((mime, ", ".join(srcset)))
+
+    if todo:
+        if pool[0] is None:
+            pool[0] = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        jobs.append((pool[0].submit(render_variants, src, todo), todo))
+
+    derivatives = [variant_path(media_path, w, ext) for ext, _ in IMAGE_FORMATS for w in widths]
+    info = {"width": width, "height": height, "sources": sources, "derivatives": derivatives, "src": media_path}
+    pending.append(info)
+    return info
+
+
+def picture_html(media_path, info, alt):
+    sources = [{"mime": mime, "srcset": srcset} for mime, srcset in info["sources"]] if info else []
+    return PICTURE.render(info=info, sources=sources, sizes=IMAGE_SIZES, src=media_path, alt=alt)
+
+
+def wait_for_images():
+    # Перед записью страниц все копии должны лежать на диске
+    done = 0
+    while jobs:
+        job, todo = jobs.pop()
+        try:
+            done += job.result()
+        except Exception as e:
+            print(f"Ошибка обработки фото: {e}")
+        for _, _, dst in todo:
+            if os.path.exists(dst):
+                note_changed(dst)
+    if done:
+        print(f"Готово копий фото: {done}")
+
+
+def settle_images():
+    # После wait_for_images: {путь фото: info} для фото, часть копий которых
+    # не получилась — в srcset остаётся только то, что лежит на диске
+    failed = {}
+    while pending:
+        info = pending.pop()
+        missing = {p for p in info["derivatives"] if not os.path.exists("public" + p)}
+        if not missing:
+            continue
+        sources = []
+        for mime, srcset in info["sources"]:
+            kept = [s for s in srcset.split(", ") if s.split(" ")[0] not in missing]
+            if kept:
+                sources.append((mime, ", ".join(kept)))
+        info["sources"] = sources
+        info["derivatives"] = [p for p in info["derivatives"] if p not in missing]
+        failed[info["src"]] = info
+    return failed
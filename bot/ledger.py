@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+# Журнал ключей для дедупликации (seen_ids.txt, vk_posted.txt).
+# Читается один раз за запуск, новые ключи дописываются в конец строкой
+# "ключ<TAB>unix-время" и сбрасываются на диск одним fsync в commit().
+# Старые ключи (старше ttl) выкидываются при уплотнении файла.
+
+COMPACT_SLACK = 200
+
+
+class Ledger:
+    def __init__(self, path, ttl_days=None):
+        self.path = path
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self.keys = {}
+        self.pending = []
+        self.lines = 0
+        self.stale = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        now = int(time.time())
+        cutoff = now - self.ttl if self.ttl else None
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                self.lines += 1
+                key, _, ts = line.partition("\t")
+                if not ts.isdigit():
+                    # Старый формат без времени: ключ считаем свежим
+                    # и при уплотнении проставляем ему время
+                    ts = str(now)
+                    self.stale += 1
+                ts = int(ts)
+                if cutoff and ts < cutoff:
+                    self.stale += 1
+                    continue
+                self.keys[key] = max(ts, self.keys.get(key, 0))
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def add(self, key):
+        if key in self.keys:
+            return
+        ts = int(time.time())
+        self.keys[key] = ts
+        self.pending.append(f"{key}\t{ts}\n")
+
+    def commit(self):
+        if self.stale or self.lines > 2 * len(self.keys) + COMPACT_SLACK:
+            self.compact()
+            return
+        if not self.pending:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(self.pending)
+            f.flush()
+            os.fsync(f.fileno())
+        self.lines += len(self.pending)
+        self.pending = []
+
+    def compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for key, ts in sorted(self.keys.items(), key=lambda kv: kv[1]):
+                f.write(f"{key}\t{ts}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.lines = len(self.keys)
+        self.stale = 0
+        self.pending = []
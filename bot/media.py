@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from output import note_changed
+from metrics import timed, count
+
+DOWNLOAD_WORKERS = 6
+DOWNLOAD_TIMEOUT = (10, 60)
+DOWNLOAD_ATTEMPTS = 3
+CHUNK_SIZE = 256 * 1024
+# В ссылке на файл Telegram лежит токен бота — в логи и на сайт она не попадает
+TOKEN_URL_RE = re.compile(r"/bot[^/\s]+/")
+
+# Манифест медиа: путь -> время появления и посты, которые на него ссылаются.
+# Записи добавляются по времени, поэтому старые всегда в начале.
+MEDIA_MANIFEST = "media_manifest.json"
+MEDIA_DIRS = ["public/media/photos", "public/media/videos"]
+manifest = [None]
+unique_index = {}
+manifest_lock = threading.Lock()
+
+# Одна сессия на весь запуск ради keep-alive; повторы — только в stream_to_file,
+# он же повторяет и обрыв посреди файла. http:// — локальный Bot API
+http = requests.Session()
+adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS)
+http.mount("https://", adapter)
+http.mount("http://", adapter)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def stream_to_file(url, fpath):
+    # Пишем поток на диск и тут же считаем BLAKE2 содержимого
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        digest = hashlib.blake2b(digest_size=16)
+        try:
+            with http.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                r.raise_for_status()
+                with open(fpath, "wb") as f:
+                    for chunk in r.iter_content(CHUNK_SIZE):
+                        digest.update(chunk)
+                        f.write(chunk)
+                        count("bytes_downloaded", len(chunk))
+            count("media_downloaded")
+            return digest.hexdigest()
+        except (requests.RequestException, OSError) as e:
+            if os.path.exists(fpath):
+                os.remove(fpath)
+            # 404 и прочие ошибки клиента повтором не лечатся
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if attempt == DOWNLOAD_ATTEMPTS or (status and status not in RETRY_STATUS):
+                raise
+            time.sleep(2 ** attempt)
+
+
+def hide_token(text):
+    return TOKEN_URL_RE.sub("/bot***/", text)
+
+
+@timed("download")
+def download_and_save(file_url, save_dir, ext, unique_id=None):
+    # Имя файла — хеш содержимого: одинаковые байты лежат в одном файле
+    try:
+        os.makedirs(save_dir, exist_ok=True)
+        tmp = os.path.join(save_dir, uuid.uuid4().hex + ".part")
+        fname = stream_to_file(file_url, tmp) + ext
+        fpath = os.path.join(save_dir, fname)
+        if os.path.exists(fpath):
+            os.remove(tmp)
+            print(f"Уже есть (тот же файл): {fpath}")
+        else:
+            os.replace(tmp, fpath)
+            note_changed(fpath)
+            print(f"Сохранил: {fpath}")
+        media_path = f"/media/{os.path.basename(save_dir)}/{fname}"
+        note_media(media_path, unique_id)
+        return media_path
+    except Exception as e:
+        print(f"Ошибка скачивания в {save_dir}: {hide_token(str(e))}")
+        return None
+
+
+def media_manifest():
+    if manifest[0] is None:
+        manifest[0] = {}
+        if os.path.exists(MEDIA_MANIFEST):
+            with open(MEDIA_MANIFEST, "r", encoding="utf-8") as f:
+                manifest[0] = json.load(f)
+        for path, entry in manifest[0].items():
+            for uid in entry.get("unique_ids", []):
+                unique_index[uid] = path
+    return manifest[0]
+
+
+def find_media(unique_id):
+    media_manifest()
+    path = unique_index.get(unique_id) if unique_id else None
+    if path and os.path.exists("public" + path):
+        return path
+    return None
+
+
+def note_media(media_path, unique_id=None):
+    with manifest_lock:
+        entries = media_manifest()
+        entry = entries.get(media_path)
+        if entry is None:
+            entry = entries[media_path] = {"created": int(time.time()), "refs": []}
+        if unique_id and unique_id not in entry.setdefault("unique_ids", []):
+            entry["unique_ids"].append(unique_id)
+            unique_index[unique_id] = media_path
+
+
+def save_media_manifest():
+    tmp = MEDIA_MANIFEST + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(media_manifest(), f, ensure_ascii=False, indent=0)
+    os.replace(tmp, MEDIA_MANIFEST)
+
+
+def bootstrap_media_manifest(cards):
+    # Разовый учёт файлов, которые лежали до манифеста: отсчёт срока — с сегодня
+    if os.path.exists(MEDIA_MANIFEST):
+        return
+    refs = {}
+    for card in cards:
+        if card.get("media_path"):
+            refs.setdefault(card["media_path"], []).append(card["key"])
+    now = int(time.time())
+    entries = media_manifest()
+    for folder in MEDIA_DIRS:
+        if not os.path.exists(folder):
+            continue
+        for fname in sorted(os.listdir(folder)):
+            path = f"/media/{os.path.basename(folder)}/{fname}"
+            entries[path] = {"created": now, "refs": refs.get(path, [])}
+    save_media_manifest()
+    print(f"Манифест медиа: учтено {len(entries)} файлов")
+
+
+def note_derivatives(media_path, derivatives):
+    note_media(media_path)
+    media_manifest()[media_path]["derivatives"] = derivatives
+
+
+def register_media(media_path, key):
+    note_media(media_path)
+    entry = media_manifest()[media_path]
+    if key not in entry["refs"]:
+        entry["refs"].append(key)
+
+
+def replace_media(old_path, new_path, key):
+    # Карточка перешла на другой файл (пережатое видео): ссылка и копии — к новому
+    note_media(new_path)
+    entries = media_manifest()
+    old = entries.get(old_path)
+    if old:
+        entries[new_path]["derivatives"] = old.pop("derivatives", [])
+        release_media(old_path, key)
+    register_media(new_path, key)
+
+
+def release_media(media_path, key):
+    entry = media_manifest().get(media_path)
+    if entry and key in entry["refs"]:
+        entry["refs"].remove(key)
+
+
+def expire_media(cutoff_ts):
+    # Идём от самых старых записей и останавливаемся на первой свежей
+    entries = media_manifest()
+    expired = []
+    for path, entry in entries.items():
+        if entry["created"] >= cutoff_ts:
+            break
+        if not entry["refs"]:
+            expired.append(path)
+    for path in expired:
+        for p in [path] + entries[path].get("derivatives", []):
+            fpath = "public" + p
+            if os.path.exists(fpath):
+                os.remove(fpath)
+                print(f"Удалено старое медиа: {fpath}")
+        for uid in entries.pop(path).get("unique_ids", []):
+            if unique_index.get(uid) == path:
+                del unique_index[uid]
+    return len(expired)
+
+
+def download_all(jobs):
+    # jobs: {ключ: (file_url, save_dir, ext)} -> {ключ: локальный путь или None}
+    if not jobs:
+        return {}
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        futures = {k: pool.submit(download_and_save, *job) for k, job in jobs.items()}
+        return {k: f.result() for k, f in futures.items()}
+
+
+class MultipartStream:
+    # multipart/form-data с одним файлом; тело читается с диска кусками,
+    # длина известна заранее, поэтому requests ставит Content-Length
+    def __init__(self, field, path, content_type):
+        self.boundary = uuid.uuid4().hex
+        head = (f"--{self.boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{field}\"; filename=\"{os.path.basename(path)}\"\r\n"
+                f"Content-Type: {content_type}\r\n\r\n").encode()
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self.length = len(head) + os.path.getsize(path) + len(tail)
+        self.parts = [io.BytesIO(head), open(path, "rb"), io.BytesIO(tail)]
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+        out = b""
+        while self.parts and len(out) < size:
+            chunk = self.parts[0].read(size - len(out))
+            if chunk:
+                out += chunk
+            else:
+                self.parts.pop(0).close()
+        return out
+
+    def close(self):
+        for part in self.parts:
+            part.close()
+        self.parts = []
+
+
+def upload_file(url, field, path, content_type):
+    body = MultipartStream(field, path, content_type)
+    try:
+        r = http.post(url, data=body, timeout=(10, 300),
+                      headers={"Content-Type": f"multipart/form-data; boundary={body.boundary}"})
+        r.raise_for_status()
+        return r
+    finally:
+        body.close()
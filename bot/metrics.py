@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Замеры запуска: сколько времени ушло на каждый этап и сколько сделано работы.
+# span("download") суммирует время блока (из потоков тоже — тогда сумма больше
+# длительности запуска), count("bytes_downloaded", n) — счётчики. finish_run()
+# пишет metrics_<бот>.json, а при METRICS_PROM=1 ещё и metrics_<бот>.prom
+# в текстовом формате Prometheus.
+# METRICS_PROFILE=cpu — cProfile основного потока в profile_<бот>.prof,
+# METRICS_PROFILE=mem — tracemalloc: пик и места с наибольшими аллокациями.
+# Можно вместе: METRICS_PROFILE=cpu,mem.
+
+METRICS_REPORT = "metrics_{}.json"
+METRICS_PROM = "metrics_{}.prom"
+PROFILE_FILE = "profile_{}.prof"
+PROFILE_TOP = 15
+
+run = {"name": "run", "started": 0.0, "wall": 0.0, "spans": {}, "counters": {}, "profiler": None, "tracemalloc": False}
+lock = threading.Lock()
+
+
+def profile_modes():
+    return {m.strip() for m in os.getenv("METRICS_PROFILE", "").split(",") if m.strip()}
+
+
+def start_run(name):
+    run.update(name=name, started=time.perf_counter(), wall=time.time(), spans={}, counters={},
+               profiler=None, tracemalloc=False)
+    modes = profile_modes()
+    if "cpu" in modes:
+        import cProfile
+        run["profiler"] = cProfile.Profile()
+        run["profiler"].enable()
+    if "mem" in modes:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        run["tracemalloc"] = True
+
+
+def add_time(name, seconds):
+    with lock:
+        stat = run["spans"].setdefault(name, [0, 0.0, 0.0])
+        stat[0] += 1
+        stat[1] += seconds
+        stat[2] = max(stat[2], seconds)
+
+
+@contextmanager
+def span(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - t0)
+
+
+def timed(name):
+    # Декоратор: весь вызов функции — один span
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def count(name, n=1):
+    with lock:
+        run["counters"][name] = run["counters"].get(name, 0) + n
+
+
+def report():
+    with lock:
+        return {
+            "bot": run["name"],
+            "started": datetime.fromtimestamp(run["wall"], timezone.utc).isoformat(timespec="seconds"),
+            "duration": round(time.perf_counter() - run["started"], 4),
+            "spans": {k: {"count": c, "total": round(t, 4), "max": round(m, 4)}
+                      for k, (c, t, m) in sorted(run["spans"].items())},
+            "counters": dict(sorted(run["counters"].items())),
+        }
+
+
+def prometheus(rep):
+    label = f'bot="{rep["bot"]}"'
+    lines = ["# TYPE newsforsvoi_run_duration_seconds gauge",
+             f"newsforsvoi_run_duration_seconds{{{label}}} {rep['duration']}",
+             "# TYPE newsforsvoi_span_seconds gauge"]
+    lines += [f'newsforsvoi_span_seconds{{{label},span="{k}"}} {v["total"]}' for k, v in rep["spans"].items()]
+    lines.append("# TYPE newsforsvoi_span_calls gauge")
+    lines += [f'newsforsvoi_span_calls{{{label},span="{k}"}} {v["count"]}' for k, v in rep["spans"].items()]
+    lines.append("# TYPE newsforsvoi_work gauge")
+    lines += [f'newsforsvoi_work{{{label},counter="{k}"}} {v}' for k, v in rep["counters"].items()]
+    return "\n".join(lines) + "\n"
+
+
+def write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def stop_profilers(rep):
+    name = run["name"]
+    if run["profiler"] is not None:
+        import pstats
+        run["profiler"].disable()
+        run["profiler"].dump_stats(PROFILE_FILE.format(name))
+        out = io.StringIO()
+        pstats.Stats(run["profiler"], stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        rep["profile"] = {"file": PROFILE_FILE.format(name), "top": out.getvalue()}
+        run["profiler"] = None
+    if run["tracemalloc"]:
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP]
+        rep["memory"] = {"current": current, "peak": peak,
+                         "top": [{"where": str(s.traceback), "size": s.size, "count": s.count} for s in top]}
+        tracemalloc.stop()
+        run["tracemalloc"] = False
+
+
+def finish_run():
+    # Пишет отчёт и возвращает его; замеры следующего запуска — после start_run
+    rep = report()
+    stop_profilers(rep)
+    write_atomic(METRICS_REPORT.format(rep["bot"]), json.dumps(rep, ensure_ascii=False, indent=1))
+    if os.getenv("METRICS_PROM"):
+        write_atomic(METRICS_PROM.format(rep["bot"]), prometheus(rep))
+    return rep
+
+
+def summary(rep, top=6):
+    # Строка для лога: самые долгие этапы
+    spans = sorted(rep["spans"].items(), key=lambda kv: -kv[1]["total"])[:top]
+    parts = [f"{k} {v['total']:.2f}с" for k, v in spans]
+    return f"{rep['duration']:.2f}с всего; " + ", ".join(parts)
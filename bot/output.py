@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import json
+import hashlib
+import threading
+
+from metrics import timed, count
+
+# Запись файлов сайта только при изменении содержимого.
+# Хеши прошлой сборки лежат в build_manifest_<бот>.json: совпал хеш и размер
+# файла на диске — не трогаем ни файл, ни его mtime, поэтому git и деплой
+# не видят изменений. mtime не сравниваем: после checkout он у всех файлов новый.
+# finish_build() возвращает изменённые за сборку пути — для лога. Деплой их
+# не использует: он сверяет public/ со своим deploy_manifest.json, потому что
+# часть изменений приходит без этой сборки (коммиты history-бота, правки руками).
+
+BUILD_MANIFEST = "build_manifest_{}.json"
+
+build = {"name": "site", "hashes": None, "changed": [], "dirty": False}
+lock = threading.Lock()
+
+
+def start_build(name):
+    build.update(name=name, hashes=None, changed=[], dirty=False)
+
+
+def hashes():
+    if build["hashes"] is None:
+        build["hashes"] = {}
+        path = BUILD_MANIFEST.format(build["name"])
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                build["hashes"] = json.load(f)
+    return build["hashes"]
+
+
+def note_changed(path):
+    with lock:
+        if path not in build["changed"]:
+            build["changed"].append(path)
+
+
+@timed("write")
+def write_output(path, data):
+    # data — str или bytes; True, если файл действительно переписан
+    raw = data.encode("utf-8") if isinstance(data, str) else data
+    digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+    with lock:
+        known = hashes().get(path)
+    # Размер ловит правку файла в обход манифеста (sitemap.xml пишут оба бота)
+    if known == digest and os.path.exists(path) and os.path.getsize(path) == len(raw):
+        count("files_unchanged")
+        return False
+    if known is None and os.path.exists(path) and os.path.getsize(path) == len(raw):
+        # Файла ещё нет в манифесте: сверяем с диском один раз
+        with open(path, "rb") as f:
+            if f.read() == raw:
+                with lock:
+                    hashes()[path] = digest
+                    build["dirty"] = True
+                count("files_unchanged")
+                return False
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(raw)
+    os.replace(tmp, path)
+    with lock:
+        hashes()[path] = digest
+        build["dirty"] = True
+    note_changed(path)
+    count("files_written")
+    count("bytes_written", len(raw))
+    return True
+
+
+def render_output(path, template, **ctx):
+    # Шаблон пишется в память, на диск — только если что-то поменялось
+    buf = io.StringIO()
+    template.stream(buf, **ctx)
+    return write_output(path, buf.getvalue())
+
+
+def finish_build():
+    # Сохраняет хеши; возвращает изменённые за сборку пути
+    with lock:
+        changed, build["changed"] = build["changed"], []
+        if build["dirty"]:
+            path = BUILD_MANIFEST.format(build["name"])
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(hashes(), f, ensure_ascii=False, sort_keys=True, indent=0)
+            os.replace(tmp, path)
+            build["dirty"] = False
+    return changed
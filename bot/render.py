@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import re
+import json
+
+# Маленькие шаблоны для карточек, страниц, RSS и sitemap.
+# {{ имя }} экранируется, {{ имя|safe }} вставляется как есть,
+# {% if имя %}/{% else %}/{% endif %} и {% for x in имя %}/{% endfor %}.
+# Шаблон один раз превращается в функцию Python, рендер — это вызовы w(...).
+
+TOKEN_RE = re.compile(r"{{\s*(.+?)\s*}}|{%\s*(.+?)\s*%}", re.DOTALL)
+# Строка, где только {% ... %}, не оставляет в выводе пустую строку
+BLOCK_LINE_RE = re.compile(r"^[ \t]*({%[^%]*%})[ \t]*\n", re.MULTILINE)
+NAME_RE = re.compile(r"^[a-z_][a-z0-9_]*(\.[a-z0-9_]+)*$", re.IGNORECASE)
+
+
+def escape(value):
+    if value is None:
+        return ""
+    return (str(value).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+            .replace('"', "&quot;").replace("'", "&#39;"))
+
+
+def to_json(value):
+    # JSON внутри <script>: "</" не должен закрыть тег
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+
+
+FILTERS = {
+    "e": escape,
+    "safe": lambda v: "" if v is None else str(v),
+    "json": to_json,
+    # Текст с переносами строк как в Telegram
+    "br": lambda v: escape(v).replace("\n", "<br>"),
+}
+
+
+class TemplateError(Exception):
+    pass
+
+
+class Template:
+    def __init__(self, source, name="template"):
+        self.name = name
+        self.code = compile_source(BLOCK_LINE_RE.sub(r"\1", source), name)
+        scope = {"F": FILTERS}
+        exec(compile(self.code, f"<{name}>", "exec"), scope)
+        self.fn = scope["render"]
+
+    def render(self, **ctx):
+        buf = []
+        self.fn(ctx, buf.append)
+        return "".join(buf)
+
+    def stream(self, out, **ctx):
+        # Пишем прямо в открытый файл, без промежуточной строки
+        self.fn(ctx, out.write)
+
+
+def lookup(expr, loop_vars, name):
+    if not NAME_RE.match(expr):
+        raise TemplateError(f"{name}: непонятное выражение {expr!r}")
+    root, *attrs = expr.split(".")
+    code = f"v_{root}" if root in loop_vars else f"c.get({root!r})"
+    for attr in attrs:
+        code = f"({code} or {{}}).get({attr!r})"
+    return code
+
+
+def compile_source(source, name):
+    lines = ["def render(c, w):"]
+    stack = []
+    loop_vars = []
+
+    def emit(line):
+        lines.append("    " * (len(stack) + 1) + line)
+
+    pos = 0
+    for m in TOKEN_RE.finditer(source):
+        if m.start() > pos:
+            emit(f"w({source[pos:m.start()]!r})")
+        pos = m.end()
+        if m.group(1):
+            expr, _, flt = m.group(1).partition("|")
+            flt = flt.strip() or "e"
+            if flt not in FILTERS:
+                raise TemplateError(f"{name}: неизвестный фильтр {flt!r}")
+            emit(f"w(F[{flt!r}]({lookup(expr.strip(), loop_vars, name)}))")
+            continue
+        tag, *args = m.group(2).split()
+        if tag == "if" and len(args) == 1:
+            emit(f"if {lookup(args[0], loop_vars, name)}:")
+            stack.append("if")
+        elif tag == "else" and stack and stack[-1] == "if":
+            stack.pop()
+            emit("else:")
+            stack.append("if")
+        elif tag == "for" and len(args) == 3 and args[1] == "in":
+            emit(f"for v_{args[0]} in {lookup(args[2], loop_vars, name)} or ():")
+            stack.append("for")
+            loop_vars.append(args[0])
+        elif tag in ("endif", "endfor") and stack and stack[-1] == tag[3:]:
+            stack.pop()
+            if tag == "endfor":
+                loop_vars.pop()
+        else:
+            raise TemplateError(f"{name}: неожиданный тег {m.group(0)!r}")
+        emit("pass")
+    if pos < len(source):
+        emit(f"w({source[pos:]!r})")
+    if stack:
+        raise TemplateError(f"{name}: не закрыт {{% {stack[-1]} %}}")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    # Микробенчмарк: python bot/render.py
+    import timeit
+
+    card = Template("""<article class='news-item{% if urgent %} urgent{% endif %}' id='post-{{ pid }}' lang='ru'>
+<h3 class='news-headline'>{{ headline }}</h3>
+{% for p in paragraphs %}
+<p class='{{ p.cls }}'>{{ p.text }}</p>
+{% endfor %}
+<p class='timestamp' data-ts='{{ iso_time }}'>{{ fmt_time }}</p>
+<script type='application/ld+json'>{{ microdata|json }}</script>
+</article>
+""", "bench")
+    ctx = {
+        "urgent": True, "pid": 38801, "headline": "Заголовок <с разметкой> & \"кавычками\"",
+        "paragraphs": [{"cls": "news-text", "text": "Абзац новости номер %d, довольно длинный." % i} for i in range(6)],
+        "iso_time": "2026-01-04T17:01:55+03:00", "fmt_time": "04.01.2026 17:01",
+        "microdata": {"@type": "NewsArticle", "headline": "Заголовок", "articleBody": "Текст " * 40},
+    }
+
+    def naive():
+        html = f"<article class='news-item urgent' id='post-{ctx['pid']}' lang='ru'>\n"
+        html += f"<h3 class='news-headline'>{ctx['headline']}</h3>\n"
+        for p in ctx["paragraphs"]:
+            html += f"<p class='{p['cls']}'>{p['text']}</p>\n"
+        html += f"<p class='timestamp' data-ts='{ctx['iso_time']}'>{ctx['fmt_time']}</p>\n"
+        html += f"<script type='application/ld+json'>{json.dumps(ctx['microdata'], ensure_ascii=False, indent=2)}</script>\n"
+        return html + "</article>\n"
+
+    n = 20000
+    for label, fn in [("шаблон", lambda: card.render(**ctx)), ("f-строки", naive)]:
+        best = min(timeit.repeat(fn, number=n, repeat=5)) / n
+        print(f"{label:10} {best * 1e6:6.1f} мкс на карточку")
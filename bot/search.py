@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+
+from output import write_output
+from archive import load_archive_index, read_shard_cards
+from metrics import timed
+
+# Поиск по новостям и архиву без бэкенда: статический обратный индекс.
+# Каждой карточке при добавлении выдаётся номер по порядку (свежие — больше).
+# public/search/t-<префикс>.json — основа слова -> номера карточек, шард по
+# первым двум буквам основы; public/search/d-<N>.json — по SEARCH_DOCS_CHUNK
+# карточек [key, заголовок, ссылка, дата]. Новый пост дописывается только в
+# шарды своих слов и последний кусок карточек, индекс не пересобирается.
+# Основы — стеммер Портера для русского, тот же, что в public/search.js.
+
+SEARCH_DIR = "public/search"
+SEARCH_STATE = "search_state.json"
+SEARCH_DOCS_CHUNK = 256
+INDEX_FILE_RE = re.compile(r"^[td]-[0-9a-f-]+\.json$")
+MIN_WORD = 2
+
+WORD_RE = re.compile(r"[а-яёa-z0-9]+")
+TAG_RE = re.compile(r"<script.*?</script>|<[^>]+>", re.DOTALL)
+STOP_WORDS = set("""и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по
+только ее мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть
+был него до вас нибудь опять уж вам ведь там потом себя ничего ей может они тут где есть надо ней
+для мы тебя их чем была сам чтоб без будто чего раз тоже себе под будет ж тогда кто этот того
+потому этого какой совсем ним здесь этом один почти мой тем чтобы нее были куда зачем всех никогда
+можно при наконец два об другой хоть после над больше тот через эти нас про всего них какая много
+разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им более всегда
+конечно всю между это""".split())
+
+# Стеммер Портера (snowball) для русского, версия на регулярных выражениях
+VOWELS_RV = re.compile(r"^(.*?[аеиоуыэюя])(.*)$")
+PERFECTIVE_GERUND = re.compile(r"((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$")
+REFLEXIVE = re.compile(r"(с[яь])$")
+ADJECTIVE = re.compile(r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$")
+PARTICIPLE = re.compile(r"((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$")
+VERB = re.compile(r"((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)"
+                  r"|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$")
+NOUN = re.compile(r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$")
+DERIVATIONAL = re.compile(r".*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$")
+DER = re.compile(r"ость?$")
+SUPERLATIVE = re.compile(r"(ейше|ейш)$")
+END_I = re.compile(r"и$")
+END_SOFT = re.compile(r"ь$")
+END_NN = re.compile(r"нн$")
+
+index = {"state": None, "shards": {}, "chunks": {}}
+
+
+def stem(word):
+    word = word.replace("ё", "е")
+    m = VOWELS_RV.match(word)
+    if not m:
+        return word
+    pre, rv = m.groups()
+    temp = PERFECTIVE_GERUND.sub("", rv, 1)
+    if temp == rv:
+        rv = REFLEXIVE.sub("", rv, 1)
+        temp = ADJECTIVE.sub("", rv, 1)
+        if temp != rv:
+            rv = PARTICIPLE.sub("", temp, 1)
+        else:
+            temp = VERB.sub("", rv, 1)
+            rv = NOUN.sub("", rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+    rv = END_I.sub("", rv, 1)
+    if DERIVATIONAL.match(rv):
+        rv = DER.sub("", rv, 1)
+    temp = END_SOFT.sub("", rv, 1)
+    if temp == rv:
+        rv = END_NN.sub("н", SUPERLATIVE.sub("", rv, 1), 1)
+    else:
+        rv = temp
+    return pre + rv
+
+
+def terms(text):
+    words = WORD_RE.findall((text or "").lower())
+    return {stem(w) for w in words if len(w) >= MIN_WORD and w not in STOP_WORDS}
+
+
+def shard_name(term):
+    # Кириллица в именах файлов неудобна для бакета: пишем коды символов
+    return "t-" + "-".join(format(ord(c), "x") for c in term[:2]) + ".json"
+
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def dump_json(data):
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def state():
+    if index["state"] is None:
+        index["state"] = load_json(SEARCH_STATE, {"next": 0, "keys": {}})
+    return index["state"]
+
+
+def shard(name):
+    if name not in index["shards"]:
+        index["shards"][name] = load_json(os.path.join(SEARCH_DIR, name), {})
+    return index["shards"][name]
+
+
+def chunk(n):
+    if n not in index["chunks"]:
+        index["chunks"][n] = load_json(os.path.join(SEARCH_DIR, f"d-{n}.json"), [])
+    return index["chunks"][n]
+
+
+def add_docs(docs):
+    # docs: [(key, заголовок, текст, ссылка, дата)] от старых к новым
+    st = state()
+    first = st["next"]
+    dirty_shards, dirty_chunks = set(), set()
+    for key, title, text, url, date in docs:
+        if key in st["keys"]:
+            continue
+        n = st["next"]
+        st["next"] += 1
+        st["keys"][key] = n
+        chunk(n // SEARCH_DOCS_CHUNK).append([key, title, url, date])
+        dirty_chunks.add(n // SEARCH_DOCS_CHUNK)
+        for term in terms(title + "\n" + text):
+            name = shard_name(term)
+            shard(name).setdefault(term, []).append(n)
+            dirty_shards.add(name)
+    flush(dirty_shards, dirty_chunks)
+    return st["next"] - first
+
+
+def move_docs(urls):
+    # urls: {key: новая ссылка}; слова не меняются, только кусок с карточкой
+    st = state()
+    dirty = set()
+    for key, url in urls.items():
+        n = st["keys"].get(key)
+        if n is None:
+            continue
+        doc = chunk(n // SEARCH_DOCS_CHUNK)[n % SEARCH_DOCS_CHUNK]
+        if doc[2] != url:
+            doc[2] = url
+            dirty.add(n // SEARCH_DOCS_CHUNK)
+    flush(set(), dirty)
+
+
+def flush(shards, chunks):
+    for name in shards:
+        write_output(os.path.join(SEARCH_DIR, name), dump_json(index["shards"][name]))
+    for n in chunks:
+        write_output(os.path.join(SEARCH_DIR, f"d-{n}.json"), dump_json(index["chunks"][n]))
+    if shards or chunks:
+        tmp = SEARCH_STATE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state(), f, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        os.replace(tmp, SEARCH_STATE)
+
+
+def plain_text(html):
+    return re.sub(r"\s+", " ", TAG_RE.sub(" ", html)).strip()
+
+
+def card_doc(card):
+    # Пока пост на главной, ссылка ведёт в Telegram; при переносе в архив — на шард дня
+    title = plain_text(card.get("headline") or "")
+    text = card.get("text") or plain_text(card.get("html") or "")
+    return (card["key"], title, text, card["tg_link"], card["iso_time"][:10])
+
+
+@timed("search_index")
+def index_cards(cards):
+    # Новые посты из format_post; карточки идут от старых к новым
+    added = add_docs([card_doc(c) for c in sorted(cards, key=lambda c: c["ts"])])
+    if added:
+        print(f"Поиск: добавлено карточек {added}")
+
+
+@timed("search_index")
+def bootstrap_search(cards):
+    # Разовое заполнение из шардов архива и хранилища, дальше — только дописывание
+    if os.path.exists(SEARCH_STATE):
+        return
+    # Без состояния номера в старых файлах индекса ничего не значат
+    if os.path.isdir(SEARCH_DIR):
+        for name in os.listdir(SEARCH_DIR):
+            if INDEX_FILE_RE.match(name):
+                os.remove(os.path.join(SEARCH_DIR, name))
+    index.update(state=None, shards={}, chunks={})
+    docs = []
+    for day in sorted(load_archive_index()):
+        for block in reversed(read_shard_cards(day)):
+            post_id = re.search(r"id='post-(\d+)'", block)
+            if not post_id:
+                continue
+            headline = re.search(r"<h3[^>]*>(.*?)</h3>", block, re.DOTALL)
+            title = plain_text(headline.group(1)) if headline else ""
+            docs.append((post_id.group(1), title, plain_text(block),
+                         f"/archive/{day}.html#post-{post_id.group(1)}", day))
+    docs += [card_doc(c) for c in sorted(cards, key=lambda c: c["ts"])]
+    add_docs(docs)
+    print(f"Поиск: индекс создан, карточек {state()['next']}")
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import time
+import hashlib
+
+# Почти-дубли постов: SimHash (64 бита) по парам соседних слов очищенного текста.
+# Репост с парой изменённых слов отличается на несколько бит, разные новости —
+# на 12 и больше (проверено на архиве канала). Хеш режется на SIMHASH_BANDS
+# кусков: у похожих хотя бы один кусок совпадает, поэтому сравниваем только
+# с постами из тех же корзин, а не со всеми. Окно — последние
+# NEAR_DUP_WINDOW_DAYS дней, хранится в near_dupes.json между запусками.
+
+NEAR_DUP_FILE = "near_dupes.json"
+NEAR_DUP_WINDOW_DAYS = 3
+NEAR_DUP_DISTANCE = 7
+SIMHASH_BANDS = 8
+SHINGLE = 2
+MIN_WORDS = 8
+
+WORD_RE = re.compile(r"\w+")
+BAND_BITS = 64 // SIMHASH_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+index = [None]
+
+
+def simhash(text):
+    # None — текст слишком короткий, чтобы судить о сходстве
+    words = WORD_RE.findall((text or "").lower())
+    if len(words) < MIN_WORDS:
+        return None
+    weights = [0] * 64
+    for shingle in {" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+
+
+def bands(h):
+    return [(h >> (b * BAND_BITS)) & BAND_MASK for b in range(SIMHASH_BANDS)]
+
+
+class NearDupIndex:
+    def __init__(self, path, window_days):
+        self.path = path
+        self.window = window_days * 86400
+        self.entries = {}
+        self.buckets = [{} for _ in range(SIMHASH_BANDS)]
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        cutoff = time.time() - self.window
+        with open(self.path, "r", encoding="utf-8") as f:
+            for key, ts, h in json.load(f):
+                if ts >= cutoff:
+                    self.insert(key, ts, int(h, 16))
+
+    def insert(self, key, ts, h):
+        self.entries[key] = (ts, h)
+        for b, part in enumerate(bands(h)):
+            self.buckets[b].setdefault(part, set()).add(key)
+
+    def find(self, h, ts):
+        # Ключ самого похожего поста в окне или None
+        candidates = set()
+        for b, part in enumerate(bands(h)):
+            candidates |= self.buckets[b].get(part, set())
+        best, best_dist = None, NEAR_DUP_DISTANCE + 1
+        for key in candidates:
+            other_ts, other = self.entries[key]
+            dist = bin(h ^ other).count("1")
+            if dist < best_dist and abs(ts - other_ts) <= self.window:
+                best, best_dist = key, dist
+        return best
+
+    def add(self, key, ts, h):
+        if key in self.entries:
+            return
+        self.insert(key, ts, h)
+        self.dirty = True
+
+    def expire(self):
+        cutoff = time.time() - self.window
+        for key in [k for k, (ts, _) in self.entries.items() if ts < cutoff]:
+            _, h = self.entries.pop(key)
+            for b, part in enumerate(bands(h)):
+                bucket = self.buckets[b][part]
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[b][part]
+                self.dirty = True
+
+    def __len__(self):
+        return len(self.entries)
+
+    def save(self):
+        self.expire()
+        if not self.dirty:
+            return
+        rows = sorted(([k, ts, format(h, "016x")] for k, (ts, h) in self.entries.items()), key=lambda r: r[1])
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=0)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+def near_dupes(cards=()):
+    # Индекс читается один раз за процесс; при первом запуске — из карточек хранилища
+    if index[0] is None:
+        seed = not os.path.exists(NEAR_DUP_FILE)
+        index[0] = NearDupIndex(NEAR_DUP_FILE, NEAR_DUP_WINDOW_DAYS)
+        if seed:
+            for card in cards:
+                h = simhash(card.get("text"))
+                if h is not None:
+                    index[0].add(card["key"], card["ts"], h)
+    return index[0]
+
+
+def drop_near_dupes(dupes, posts):
+    # posts: [(pid, ts, message_id, текст)] в любом порядке -> {pid дубля: pid оригинала}.
+    # Идём от старых к новым: остаётся первый пост, а не последний пришедший
+    dropped = {}
+    for pid, ts, _, text in sorted(posts, key=lambda p: (p[1], p[2])):
+        h = simhash(text)
+        if h is None:
+            continue
+        same = dupes.find(h, ts)
+        # Сам пост уже в индексе, если его пачку обрабатывают повторно
+        if same and same != pid:
+            dropped[pid] = same
+        else:
+            # Второй такой же пост из этой же пачки тоже поймаем
+            dupes.add(pid, ts, h)
+    return dropped
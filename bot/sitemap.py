@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+
+from render import Template
+from output import render_output
+
+# public/sitemap.xml — индекс; каждый бот пишет только свою часть,
+# поэтому новостной и исторический боты больше не затирают друг друга.
+
+SITE_URL = "https://newsforsvoi.ru"
+SITEMAP_INDEX = "public/sitemap.xml"
+SITEMAP_NEWS = "public/sitemap-news.xml"
+SITEMAP_HISTORY = "public/sitemap-history.xml"
+SITEMAP_PARTS = [SITEMAP_NEWS, SITEMAP_HISTORY]
+LASTMOD_RE = re.compile(r"<lastmod>([^<]+)</lastmod>")
+
+URLSET = Template("""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{% for u in urls %}
+  <url><loc>{{ site }}{{ u.loc }}</loc>{% if u.lastmod %}<lastmod>{{ u.lastmod }}</lastmod>{% endif %}<changefreq>{{ u.freq }}</changefreq><priority>{{ u.prio }}</priority></url>
+{% endfor %}
+</urlset>""", "urlset")
+
+SITEMAP_INDEX_XML = Template("""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{% for p in parts %}
+  <sitemap><loc>{{ site }}/{{ p.name }}</loc>{% if p.lastmod %}<lastmod>{{ p.lastmod }}</lastmod>{% endif %}</sitemap>
+{% endfor %}
+</sitemapindex>""", "sitemap_index")
+
+
+def write_urlset(path, urls):
+    # urls: [(путь от корня сайта, lastmod, changefreq, priority)]; lastmod=None — без даты
+    rows = [{"loc": loc, "lastmod": lastmod, "freq": freq, "prio": prio} for loc, lastmod, freq, prio in urls]
+    if not render_output(path, URLSET, site=SITE_URL, urls=rows):
+        return False
+    write_sitemap_index()
+    return True
+
+
+def part_lastmod(path):
+    # Самая свежая дата внутри части, чтобы индекс зависел только от содержимого
+    with open(path, "r", encoding="utf-8") as f:
+        dates = LASTMOD_RE.findall(f.read())
+    return max(dates, default=None)
+
+
+def write_sitemap_index():
+    parts = []
+    for path in SITEMAP_PARTS:
+        if os.path.exists(path):
+            parts.append({"name": os.path.basename(path), "lastmod": part_lastmod(path)})
+    render_output(SITEMAP_INDEX, SITEMAP_INDEX_XML, site=SITE_URL, parts=parts)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+
+# Хранилище карточек: append-only JSONL, одна запись на строку.
+# Повторная запись с тем же key заменяет предыдущую,
+# запись {"key": ..., "deleted": true} убирает карточку из хранилища.
+
+
+def load_store(path):
+    records = {}
+    garbage = 0
+    if not os.path.exists(path):
+        return records, garbage
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                print(f"Битая строка в {path} — пропуск")
+                garbage += 1
+                continue
+            key = rec.get("key")
+            if rec.get("deleted"):
+                # Мусор — сама отметка и запись, которую она удалила (если была)
+                garbage += 1 if records.pop(key, None) is None else 2
+            else:
+                # Мусор — заменённая запись
+                garbage += key in records
+                records[key] = rec
+    # garbage — ровно столько строк, сколько уберёт compact_store
+    return records, garbage
+
+
+def append_records(path, records):
+    if not records:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def remove_records(path, keys):
+    append_records(path, [{"key": k, "deleted": True} for k in keys])
+
+
+def compact_store(path, records):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for rec in records.values():
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def sorted_records(records, reverse=True):
+    return sorted(records.values(), key=lambda r: r.get("ts", 0), reverse=reverse)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+from functools import lru_cache
+
+# Чистка текста постов и рубрики.
+# Выражения компилируются один раз при импорте, очищенный текст кешируется:
+# за пост один caption чистится до четырёх раз. Рубрики и их слова лежат
+# в bot/categories.json и ищутся за один проход по тексту, сколько бы слов
+# ни было в правилах.
+
+CATEGORIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "categories.json")
+CLEAN_CACHE_SIZE = 4096
+
+STRIP_PHRASES = [r"Подписаться на новости для своих", r"https://t\.me/newsSVOih", r"РФ"]
+EMOJI = r"[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]+"
+# По отдельности: одно выражение через | медленнее, re теряет поиск по литералу
+CLEAN_RES = [re.compile(p, re.IGNORECASE) for p in STRIP_PHRASES] + [re.compile(EMOJI)]
+
+
+@lru_cache(maxsize=CLEAN_CACHE_SIZE)
+def clean_text(text):
+    if not text:
+        return ""
+    for regex in CLEAN_RES:
+        text = regex.sub("", text)
+    # Сохраняем переносы строк!
+    return text.strip()
+
+
+class KeywordMatcher:
+    # Слова всех правил собраны в префиксное дерево и скомпилированы в одно
+    # выражение (?=(...)): движок re проходит текст один раз и на каждой позиции
+    # спускается по дереву, а не перебирает слова. Поиск подстрок, как у `in`.
+    def __init__(self, rules):
+        self.names = [name for name, _ in rules]
+        self.masks = {}
+        for i, (_, words) in enumerate(rules):
+            for word in words:
+                self.masks[word] = self.masks.get(word, 0) | 1 << i
+        # На позиции находится самое длинное слово, поэтому слово наследует
+        # правила своих префиксов: «Мирный» означает и «Мир»
+        for word in list(self.masks):
+            for k in range(1, len(word)):
+                self.masks[word] |= self.masks.get(word[:k], 0)
+        trie = {}
+        for word in self.masks:
+            node = trie
+            for ch in word:
+                node = node.setdefault(ch, {})
+            node[""] = True
+        self.regex = re.compile("(?=(" + trie_pattern(trie) + "))") if self.masks else None
+
+    def scan(self, text):
+        # Битовая маска всех правил, чьи слова встретились в тексте
+        found = 0
+        if self.regex:
+            for m in self.regex.finditer(text):
+                found |= self.masks[m.group(1)]
+        return found
+
+    def first(self, text):
+        # Первое по порядку в конфиге правило, как цепочка if/elif
+        found = self.scan(text)
+        if not found:
+            return None
+        return self.names[(found & -found).bit_length() - 1]
+
+
+def trie_pattern(node):
+    # Длинные ветки раньше конца слова: жадный (...)? берёт самое длинное совпадение
+    alts = [re.escape(ch) + trie_pattern(sub) for ch, sub in sorted(node.items()) if ch]
+    if not alts:
+        return ""
+    body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+    return f"(?:{body})?" if "" in node else body
+
+
+def load_categories(path=CATEGORIES_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+CATEGORIES = load_categories()
+CATEGORY_MATCHER = KeywordMatcher([(c["name"], c["keywords"]) for c in CATEGORIES])
+
+
+def detect_category(text):
+    return CATEGORY_MATCHER.first(text or "")
+
+
+def category_feeds():
+    # Рубрика -> slug ленты public/feeds/<slug>.xml
+    return {c["name"]: c["slug"] for c in CATEGORIES if c.get("slug")}
+
+
+if __name__ == "__main__":
+    # Бенчмарк на постах канала: python bot/textproc.py [posts_store.jsonl | *.html ...]
+    import sys
+    import timeit
+
+    def corpus(paths):
+        texts = []
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                if path.endswith(".jsonl"):
+                    for line in f:
+                        try:
+                            texts.append(json.loads(line).get("text") or "")
+                        except ValueError:
+                            pass
+                    continue
+                for block in re.findall(r"<article.*?</article>", f.read(), re.DOTALL):
+                    block = re.sub(r"<script.*?</script>", "", block, flags=re.DOTALL)
+                    texts.append(re.sub(r"<[^>]+>", "\n", block).strip())
+        return [t for t in texts if t]
+
+    texts = corpus(sys.argv[1:] or ["posts_store.jsonl", "public/news.html", "public/archive.html"])
+    if not texts:
+        sys.exit("Нет постов для бенчмарка")
+    chars = sum(map(len, texts))
+
+    def old_clean(text):
+        for p in STRIP_PHRASES:
+            text = re.sub(p, "", text, flags=re.IGNORECASE)
+        return re.sub(EMOJI, "", text).strip()
+
+    def old_category(text, rules):
+        for name, words in rules:
+            if any(w in text for w in words):
+                return name
+        return None
+
+    rules = [(c["name"], c["keywords"]) for c in CATEGORIES]
+    # Правил на порядок больше: сотни слов, как если рубрики разрастутся
+    big_rules = rules + [(f"r{i}", [f"слово{i}-{j}" for j in range(10)]) for i in range(40)]
+    big = KeywordMatcher(big_rules)
+    assert all(old_clean(t) == clean_text.__wrapped__(t) for t in texts)
+    assert all(old_category(t, rules) == detect_category(t) for t in texts)
+    assert all(old_category(t, big_rules) == big.first(t) for t in texts)
+
+    cases = [
+        ("чистка: re.sub x4", lambda: [old_clean(t) for t in texts]),
+        ("чистка: скомпилированные", lambda: [clean_text.__wrapped__(t) for t in texts]),
+        ("чистка: с кешем", lambda: [clean_text(t) for t in texts]),
+        (f"рубрики: any/in, {sum(len(w) for _, w in rules)} слов", lambda: [old_category(t, rules) for t in texts]),
+        ("рубрики: дерево", lambda: [detect_category(t) for t in texts]),
+        (f"рубрики: any/in, {sum(len(w) for _, w in big_rules)} слов", lambda: [old_category(t, big_rules) for t in texts]),
+        ("рубрики: дерево, столько же", lambda: [big.first(t) for t in texts]),
+    ]
+    print(f"Постов: {len(texts)}, символов: {chars}")
+    for label, fn in cases:
+        best = min(timeit.repeat(fn, number=3, repeat=3)) / 3
+        print(f"{label:34} {best * 1e3:8.2f} мс на корпус, {best / len(texts) * 1e6:7.2f} мкс на пост")
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from render import Template
+from output import note_changed
+from media import note_media, media_manifest
+
+# Постеры и перекодирование видео через ffmpeg, если он установлен.
+# Большие ролики (их отдаёт только локальный Bot API, TELEGRAM_LOCAL_API=1)
+# пережимаются в web-битрейт с faststart вместо того, чтобы выпадать из ленты.
+FFMPEG = shutil.which("ffmpeg")
+LOCAL_BOT_API = os.getenv("TELEGRAM_LOCAL_API") == "1"
+VIDEO_WEB_LIMIT = 20_000_000
+VIDEO_SOURCE_LIMIT = 2_000_000_000 if FFMPEG and LOCAL_BOT_API else VIDEO_WEB_LIMIT
+POSTER_WIDTH = 1280
+TRANSCODE_ARGS = [
+    "-c:v", "libx264", "-preset", "veryfast", "-crf", "28",
+    "-maxrate", "1500k", "-bufsize", "3000k",
+    "-vf", "scale='min(1280,iw)':-2",
+    "-c:a", "aac", "-b:a", "96k",
+    "-movflags", "+faststart",
+]
+
+VIDEO = Template("""{% if poster %}
+<video controls preload="none" poster="{{ poster }}">
+{% else %}
+<video controls preload="metadata">
+{% endif %}
+  <source src="{{ src }}" type="video/mp4">
+  Ваш браузер не поддерживает видео.
+</video>
+""", "video")
+
+poster_pool = ThreadPoolExecutor(max_workers=2)
+transcode_pool = ThreadPoolExecutor(max_workers=1)
+posters = []
+transcodes = []
+planned = []
+
+
+def ffmpeg(*args):
+    subprocess.run([FFMPEG, "-y", "-loglevel", "error", *args], check=True,
+                   stdin=subprocess.DEVNULL, timeout=3600)
+
+
+def make_poster(src, dst):
+    if os.path.exists(dst):
+        return
+    tmp = dst + ".part.jpg"
+    try:
+        ffmpeg("-ss", "1", "-i", src, "-frames:v", "1",
+               "-vf", f"scale='min({POSTER_WIDTH},iw)':-2", "-q:v", "4", tmp)
+        os.replace(tmp, dst)
+    finally:
+        # Недописанный файл не должен уехать в git вместе с public/
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    note_changed(dst)
+
+
+def transcode(src, dst):
+    if os.path.exists(dst):
+        return
+    tmp = dst + ".part.mp4"
+    try:
+        ffmpeg("-i", src, *TRANSCODE_ARGS, tmp)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    note_changed(dst)
+    print(f"Видео пережато: {os.path.getsize(src)/1e6:.1f}МБ → {os.path.getsize(dst)/1e6:.1f}МБ")
+
+
+def plan_video(media_path, unique_id=None):
+    # Карточка сразу ссылается на исходник; постер ждём в process_posts,
+    # а пережатый -web.mp4 подменит исходник, когда будет готов (transcoded)
+    if not FFMPEG or not media_path or not media_path.startswith("/media/"):
+        return None
+    src = "public" + media_path
+    stem = os.path.splitext(media_path)[0]
+    info = {"src": media_path, "poster": f"{stem}-poster.jpg", "derivatives": [],
+            "orig": media_path, "web": None, "unique_id": unique_id}
+    info["derivatives"].append(info["poster"])
+
+    posters.append(poster_pool.submit(make_poster, src, "public" + info["poster"]))
+
+    if os.path.exists(src) and os.path.getsize(src) > VIDEO_WEB_LIMIT:
+        info["web"] = f"{stem}-web.mp4"
+        transcodes.append((transcode_pool.submit(transcode, src, "public" + info["web"]), info))
+    planned.append(info)
+    return info
+
+
+def video_html(media_path, info):
+    # С постером браузеру не нужно тянуть начало ролика для первой отрисовки
+    if not info:
+        return VIDEO.render(src=media_path)
+    return VIDEO.render(src=info["src"], poster=info["poster"])
+
+
+def wait_for_posters():
+    while posters:
+        try:
+            posters.pop().result()
+        except Exception as e:
+            print(f"Ошибка ffmpeg (постер): {e}")
+
+
+def settle_videos():
+    # После wait_for_posters: {путь в карточке: info} для роликов без постера —
+    # их карточки перерисовываются без него
+    failed = {}
+    while planned:
+        info = planned.pop()
+        if not os.path.exists("public" + info["poster"]):
+            info["derivatives"].remove(info["poster"])
+            info["poster"] = None
+            failed[info["src"]] = info
+    return failed
+
+
+def pending_web(media_path):
+    # Куда переедет ролик после перекодирования (ВК подождёт этот файл)
+    return next((info["web"] for _, info in transcodes if info["orig"] == media_path), None)
+
+
+def transcoded(wait=False):
+    # Готовые перекодирования: info с src = -web.mp4. Без wait не блокирует —
+    # демон спрашивает на каждом цикле, cron ждёт перед выходом
+    done = []
+    for job, info in list(transcodes):
+        if not wait and not job.done():
+            continue
+        transcodes.remove((job, info))
+        try:
+            job.result()
+        except Exception as e:
+            print(f"Ошибка ffmpeg (перекодирование): {e}")
+            continue
+        info["src"] = info["web"]
+        # По file_unique_id теперь находится пережатый ролик
+        note_media(info["web"], info["unique_id"])
+        done.append(info)
+    return done
+
+
+def remove_source(info):
+    # Исходник удаляется, когда на него не ссылается ни одна карточка
+    entry = media_manifest().get(info["orig"])
+    path = "public" + info["orig"]
+    if entry is not None and not entry["refs"] and os.path.exists(path):
+        os.remove(path)
+        print(f"Исходник удалён: {path}")
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from media import http, upload_file
+from ledger import Ledger
+from metrics import timed, count
+
+VK_TOKEN = os.getenv("VK_TOKEN")
+VK_GROUP_ID = os.getenv("VK_GROUP_ID")
+VK_API = "https://api.vk.com/method/"
+VK_VERSION = "5.199"
+VK_POSTED = "vk_posted.txt"
+VK_POSTED_TTL_DAYS = 30
+VK_OUTBOX = "vk_outbox.json"
+VK_VIDEO_LIMIT = 20_000_000
+
+# Очередь на репост: сайт публикуется сразу, ВК догоняет сам
+VK_WORKERS = 3
+VK_RPS = 3
+VK_MAX_ATTEMPTS = 8
+VK_RETRY_BASE = 60
+VK_FLOOD_PAUSE = 3600
+VK_MEDIA_WAIT = 3600
+
+outbox_lock = threading.Lock()
+rate_lock = threading.Lock()
+last_call = [0.0]
+posted = [None]
+flood = threading.Event()
+
+
+class VkError(Exception):
+    def __init__(self, code, msg):
+        super().__init__(f"{code}: {msg}")
+        self.code = code
+
+
+def vk_posted():
+    # Журнал отправленного читается один раз за процесс
+    if posted[0] is None:
+        posted[0] = Ledger(VK_POSTED, VK_POSTED_TTL_DAYS)
+    return posted[0]
+
+
+def throttle():
+    # Не больше VK_RPS запросов в секунду на все потоки
+    with rate_lock:
+        wait = last_call[0] + 1.0 / VK_RPS - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        last_call[0] = time.time()
+
+
+def check(resp):
+    if "error" in resp:
+        err = resp["error"]
+        raise VkError(err.get("error_code"), err.get("error_msg"))
+    return resp.get("response", resp)
+
+
+def vk_call(method, **params):
+    throttle()
+    params.update({"access_token": VK_TOKEN, "v": VK_VERSION})
+    return check(http.post(VK_API + method, data=params, timeout=(10, 60)).json())
+
+
+def vk_upload(upload_url, field, media_path, content_type):
+    throttle()
+    return check(upload_file(upload_url, field, "public" + media_path, content_type).json())
+
+
+def load_outbox():
+    if not os.path.exists(VK_OUTBOX):
+        return []
+    with open(VK_OUTBOX, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_outbox(items):
+    tmp = VK_OUTBOX + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, VK_OUTBOX)
+
+
+def enqueue_vk(key, caption, text, media_path=None, ctype=None, pid=None):
+    if not VK_TOKEN or not VK_GROUP_ID:
+        print("VK не настроен")
+        return
+    with outbox_lock:
+        items = load_outbox()
+        if key in vk_posted() or any(i["key"] == key for i in items):
+            print("ДУБЛЬ ВК — пропуск")
+            return
+        items.append({
+            "key": key, "pid": pid, "caption": caption, "text": text,
+            "media_path": media_path, "ctype": ctype,
+            "attachments": None, "attempts": 0, "next_try": 0, "error": None,
+            "created": int(time.time()),
+        })
+        save_outbox(items)
+
+
+def upload_attachments(item):
+    media_path, ctype = item["media_path"], item["ctype"]
+    if not media_path or not os.path.exists("public" + media_path):
+        return []
+
+    if ctype == "photo":
+        server = vk_call("photos.getWallUploadServer", group_id=VK_GROUP_ID)
+        upload = vk_upload(server["upload_url"], "photo", media_path, "image/jpeg")
+        photo = vk_call("photos.saveWallPhoto", group_id=VK_GROUP_ID, photo=upload["photo"],
+                        server=upload["server"], hash=upload["hash"])[0]
+        return [f"photo{photo['owner_id']}_{photo['id']}"]
+
+    if ctype == "video":
+        size = os.path.getsize("public" + media_path)
+        if size > VK_VIDEO_LIMIT:
+            print(f"Видео {size/1e6:.1f}МБ — слишком большое для ВК")
+            return []
+        video = vk_call("video.save", group_id=VK_GROUP_ID, name=item["caption"][:50])
+        vk_upload(video["upload_url"], "video_file", media_path, "video/mp4")
+        return [f"video{video['owner_id']}_{video['video_id']}"]
+
+    return []
+
+
+@timed("vk_post")
+def send_item(item):
+    if flood.is_set():
+        return "retry"
+    media_path = item["media_path"]
+    if media_path and not os.path.exists("public" + media_path) and time.time() - item.get("created", 0) < VK_MEDIA_WAIT:
+        # Видео ещё перекодируется в фоне
+        item["next_try"] = time.time() + 60
+        return "retry"
+    try:
+        # Вложения грузим один раз: при повторе после ошибки wall.post они уже есть
+        if item["attachments"] is None:
+            item["attachments"] = upload_attachments(item)
+        message = f"{item['caption']}\n\n{item['text']}".strip() or "Новость"
+        vk_call("wall.post", owner_id=f"-{VK_GROUP_ID}", from_group=1,
+                message=message[:4095], attachments=",".join(item["attachments"]))
+        print(f"Запощено в ВК: {item['pid']}")
+        count("vk_posted")
+        with outbox_lock:
+            vk_posted().add(item["key"])
+            vk_posted().commit()
+        return "done"
+    except VkError as e:
+        item["error"] = str(e)
+        if e.code == 9:
+            print("ВК: flood control — пауза")
+            flood.set()
+            item["next_try"] = time.time() + VK_FLOOD_PAUSE
+            return "retry"
+        if e.code == 6:
+            item["next_try"] = time.time() + 1
+            return "retry"
+    except Exception as e:
+        item["error"] = str(e)
+
+    item["attempts"] += 1
+    if item["attempts"] >= VK_MAX_ATTEMPTS:
+        print(f"ВК ошибка, пост {item['pid']} снят с очереди: {item['error']}")
+        return "drop"
+    item["next_try"] = time.time() + VK_RETRY_BASE * 2 ** (item["attempts"] - 1)
+    print(f"ВК ошибка, повтор #{item['attempts']}: {item['error']}")
+    return "retry"
+
+
+def drain_outbox():
+    if not VK_TOKEN or not VK_GROUP_ID:
+        print("VK не настроен")
+        return 0
+    with outbox_lock:
+        due = [i for i in load_outbox() if i["next_try"] <= time.time()]
+    if not due:
+        return 0
+
+    flood.clear()
+    with ThreadPoolExecutor(max_workers=VK_WORKERS) as pool:
+        results = dict(zip([i["key"] for i in due], pool.map(send_item, due)))
+    updated = {i["key"]: i for i in due}
+
+    with outbox_lock:
+        items = [updated.get(i["key"], i) for i in load_outbox() if results.get(i["key"]) not in ("done", "drop")]
+        save_outbox(items)
+
+    done = sum(1 for s in results.values() if s == "done")
+    print(f"ВК: отправлено {done} из {len(due)}, в очереди {len(items)}")
+    return done
@@ -1,10 +1,60 @@
-document.addEventListener("DOMContentLoaded", () => {
-  fetch("news.html")
-    .then(response => response.text())
-    .then(html => {
-      document.getElementById("news-feed").insertAdjacentHTML("beforeend", html);
-    })
-    .catch(error => {
-      console.error("Ошибка загрузки новостей:", error);
-    });
-});
+// Лента главной: первая страница сразу, остальные — по прокрутке или кнопке.
+// Бот пишет public/feed/page-N.json: {"page", "pages", "cards": [{"key", "html"}], "next"}
+(() => {
+  const COLUMNS = 3; // раскладка по колонкам, как раньше
+  const container = document.getElementById("news-container");
+  const button = document.getElementById("load-more");
+  if (!container) return;
+
+  const cards = [];
+  const seen = new Set();
+  let next = "/feed/page-1.json";
+  let loading = false;
+
+  function layout() {
+    // Свежие сверху в каждой колонке: раскладываем из исходного порядка, а не из DOM
+    const rows = Math.ceil(cards.length / COLUMNS);
+    const ordered = [];
+    for (let r = 0; r < rows; r++) {
+      for (let c = 0; c < COLUMNS; c++) {
+        const el = cards[r + c * rows];
+        if (el) ordered.push(el);
+      }
+    }
+    ordered.forEach(el => container.appendChild(el));
+  }
+
+  async function loadMore() {
+    if (loading || !next) return;
+    loading = true;
+    try {
+      const response = await fetch(next);
+      if (!response.ok) throw new Error(response.status);
+      const page = await response.json();
+      const temp = document.createElement("div");
+      page.cards.forEach(card => {
+        // Между запросами лента могла сдвинуться — дубли пропускаем
+        if (seen.has(card.key)) return;
+        seen.add(card.key);
+        temp.innerHTML = card.html;
+        if (temp.firstElementChild) cards.push(temp.firstElementChild);
+      });
+      next = page.next;
+      layout();
+    } catch (error) {
+      if (!cards.length) container.innerHTML = "<p>Не удалось загрузить новости.</p>";
+      console.error("Ошибка загрузки ленты:", error);
+    } finally {
+      loading = false;
+      if (button) button.style.display = next ? "" : "none";
+    }
+  }
+
+  if (button) button.addEventListener("click", loadMore);
+  if ("IntersectionObserver" in window && button) {
+    new IntersectionObserver(entries => {
+      if (entries.some(e => e.isIntersecting)) loadMore();
+    }, { rootMargin: "400px" }).observe(button);
+  }
+  loadMore();
+})();
@@ -0,0 +1,134 @@
+// Поиск по новостям и архиву прямо из бакета, без сервера.
+// Индекс пишет bot/search.py: /search/t-<коды двух букв>.json — основа -> номера
+// карточек, /search/d-<N>.json — карточки [key, заголовок, ссылка, дата].
+// Стеммер должен совпадать с питоновским, иначе основы запроса не найдутся.
+(() => {
+  const SEARCH_DIR = "/search/";
+  const DOCS_CHUNK = 256;
+  const LIMIT = 30;
+  const MIN_WORD = 2;
+  const WORD_RE = /[а-яёa-z0-9]+/g;
+  const STOP_WORDS = new Set(`и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по
+только ее мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть
+был него до вас нибудь опять уж вам ведь там потом себя ничего ей может они тут где есть надо ней
+для мы тебя их чем была сам чтоб без будто чего раз тоже себе под будет ж тогда кто этот того
+потому этого какой совсем ним здесь этом один почти мой тем чтобы нее были куда зачем всех никогда
+можно при наконец два об другой хоть после над больше тот через эти нас про всего них какая много
+разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им более всегда
+конечно всю между это`.split(/\s+/));
+
+  // Стеммер Портера для русского — те же выражения, что в bot/search.py
+  const VOWELS_RV = /^(.*?[аеиоуыэюя])(.*)$/;
+  const PERFECTIVE_GERUND = /((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$/;
+  const REFLEXIVE = /(с[яь])$/;
+  const ADJECTIVE = /(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$/;
+  const PARTICIPLE = /((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$/;
+  const VERB = /((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$/;
+  const NOUN = /(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$/;
+  const DERIVATIONAL = /.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$/;
+  const DER = /ость?$/;
+  const SUPERLATIVE = /(ейше|ейш)$/;
+
+  function stem(word) {
+    word = word.replace(/ё/g, "е");
+    const m = VOWELS_RV.exec(word);
+    if (!m) return word;
+    const pre = m[1];
+    let rv = m[2];
+    let temp = rv.replace(PERFECTIVE_GERUND, "");
+    if (temp === rv) {
+      rv = rv.replace(REFLEXIVE, "");
+      temp = rv.replace(ADJECTIVE, "");
+      if (temp !== rv) {
+        rv = temp.replace(PARTICIPLE, "");
+      } else {
+        temp = rv.replace(VERB, "");
+        rv = temp === rv ? rv.replace(NOUN, "") : temp;
+      }
+    } else {
+      rv = temp;
+    }
+    rv = rv.replace(/и$/, "");
+    if (DERIVATIONAL.test(rv)) rv = rv.replace(DER, "");
+    temp = rv.replace(/ь$/, "");
+    rv = temp === rv ? rv.replace(SUPERLATIVE, "").replace(/нн$/, "н") : temp;
+    return pre + rv;
+  }
+
+  function terms(text) {
+    const words = (text || "").toLowerCase().match(WORD_RE) || [];
+    return [...new Set(words.filter(w => w.length >= MIN_WORD && !STOP_WORDS.has(w)).map(stem))];
+  }
+
+  function shardName(term) {
+    return "t-" + [...term.slice(0, 2)].map(c => c.codePointAt(0).toString(16)).join("-") + ".json";
+  }
+
+  const files = new Map();
+  function load(name, empty) {
+    // Шарды кешируются на время страницы; нет файла — нет таких слов
+    if (!files.has(name)) {
+      files.set(name, fetch(SEARCH_DIR + name)
+        .then(r => (r.ok ? r.json() : empty))
+        .catch(() => empty));
+    }
+    return files.get(name);
+  }
+
+  async function search(query, limit = LIMIT) {
+    const qterms = terms(query);
+    if (!qterms.length) return [];
+    const lists = await Promise.all(qterms.map(t => load(shardName(t), {}).then(s => s[t] || [])));
+    const hits = new Map();
+    lists.forEach(list => list.forEach(n => hits.set(n, (hits.get(n) || 0) + 1)));
+    // Сначала карточки со всеми словами, за ними — с частью; внутри — свежие выше
+    const ranked = [...hits].sort((a, b) => b[1] - a[1] || b[0] - a[0]).slice(0, limit);
+    const chunks = await Promise.all([...new Set(ranked.map(([n]) => Math.floor(n / DOCS_CHUNK)))]
+      .map(c => load(`d-${c}.json`, []).then(docs => [c, docs])));
+    const byChunk = new Map(chunks);
+    return ranked.map(([n, count]) => {
+      const doc = (byChunk.get(Math.floor(n / DOCS_CHUNK)) || [])[n % DOCS_CHUNK];
+      return doc && { key: doc[0], title: doc[1], url: doc[2], date: doc[3], full: count === qterms.length };
+    }).filter(Boolean);
+  }
+
+  function render(results, box, query) {
+    box.innerHTML = "";
+    if (!query.trim()) return;
+    if (!results.length) {
+      box.textContent = "Ничего не найдено";
+      return;
+    }
+    const list = document.createElement("ul");
+    results.forEach(r => {
+      const li = document.createElement("li");
+      const a = document.createElement("a");
+      a.href = r.url;
+      a.textContent = r.title || "Без заголовка";
+      if (/^https?:/.test(r.url)) a.target = "_blank";
+      const date = document.createElement("small");
+      date.textContent = " " + r.date.split("-").reverse().join(".");
+      li.append(a, date);
+      list.appendChild(li);
+    });
+    box.appendChild(list);
+  }
+
+  window.siteSearch = { search, stem, terms };
+
+  const input = document.getElementById("site-search");
+  const box = document.getElementById("search-results");
+  if (!input || !box) return;
+  let timer = null;
+  let seq = 0;
+  input.addEventListener("input", () => {
+    clearTimeout(timer);
+    timer = setTimeout(async () => {
+      const query = input.value;
+      const mine = ++seq;
+      const results = await search(query);
+      // Ответ на устаревший запрос не рисуем
+      if (mine === seq) render(results, box, query);
+    }, 150);
+  });
+})();
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# Модули бота импортируют друг друга как файлы из bot/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot"))
+# bot.py создаёт TeleBot при импорте; в тестах сеть не нужна
+os.environ.setdefault("TELEGRAM_TOKEN", "123:test")
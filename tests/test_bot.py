@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import types
+
+import pytest
+
+import bot
+import search
+import simhash
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    # Состояние бота — файлы в текущем каталоге
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "public").mkdir()
+    monkeypatch.setattr(simhash, "index", [None])
+    monkeypatch.setattr(search, "index", {"state": None, "shards": {}, "chunks": {}})
+    return tmp_path
+
+
+def post(mid, text, ctype="text", date=1_790_000_000, **extra):
+    fields = dict(message_id=mid, date=date, text=text, caption=None, content_type=ctype, media_group_id=None)
+    fields.update(extra)
+    return types.SimpleNamespace(**fields)
+
+
+def photo(mid, caption, unique_id):
+    size = types.SimpleNamespace(file_id=f"file-{mid}", file_unique_id=unique_id)
+    return post(mid, None, "photo", caption=caption, photo=[size])
+
+
+def test_get_file_error_gives_text_card(site, monkeypatch):
+    def too_big(file_id):
+        raise RuntimeError("400 file is too big")
+    monkeypatch.setattr(bot.bot, "get_file", too_big)
+    store, seen = {}, set()
+    cards = bot.process_posts([photo(9001, "Большое фото с подписью", "uid-9001")], store, seen)
+    assert [c["key"] for c in cards] == ["9001"]
+    assert cards[0]["media_path"] is None and "<img" not in cards[0]["html"]
+    assert "9001" in seen
+
+
+def test_every_urgent_post_in_batch_is_published(site):
+    store, seen = {}, set()
+    posts = [post(9102, "Вторая #срочно новость про обстрел"), post(9101, "Первая #срочно новость про погоду")]
+    cards = bot.process_posts(posts, store, seen)
+    assert sorted(c["key"] for c in cards) == ["9101", "9102"]
+    assert {"9101", "9102"} <= set(seen)
+
+
+def update(uid, mid, gid=None):
+    return types.SimpleNamespace(update_id=uid, channel_post=post(mid, None, "photo", media_group_id=gid,
+                                                                  chat=types.SimpleNamespace(username=bot.CHANNEL_ID[1:])))
+
+
+def test_album_split_by_page_waits_for_next_run(site, monkeypatch):
+    page = [update(500, 1), update(501, 2, "g"), update(502, 3, "g")]
+    monkeypatch.setattr(bot, "UPDATES_PAGE", len(page))
+    monkeypatch.setattr(bot.bot, "get_updates", lambda **kw: page)
+    posts, offset = bot.fetch_latest_posts()
+    assert [p.message_id for p in posts] == [1] and offset == 501
+
+
+def test_finished_transcode_republishes_card(site, monkeypatch):
+    import media
+    import videos
+    from concurrent.futures import Future
+    monkeypatch.setattr(media, "manifest", [{}])
+    monkeypatch.setattr(media, "unique_index", {})
+    (site / "public/media/videos").mkdir(parents=True)
+    (site / "public/media/videos/v.mp4").write_bytes(b"x" * 10)
+    (site / "public/media/videos/v-web.mp4").write_bytes(b"x")
+    store, seen = {}, bot.load_seen_ids()
+    cards = bot.process_posts([post(9201, "Видео с места событий")], store, seen)
+    card = cards[0]
+    card.update(media_path="/media/videos/v.mp4", html='<source src="/media/videos/v.mp4" type="video/mp4">')
+    media.register_media(card["media_path"], card["key"])
+    job = Future()
+    job.set_result(None)
+    info = {"src": "/media/videos/v.mp4", "orig": "/media/videos/v.mp4", "web": "/media/videos/v-web.mp4",
+            "unique_id": "uid-v", "poster": None, "derivatives": []}
+    monkeypatch.setattr(videos, "transcodes", [(job, info)])
+
+    assert bot.finish_transcodes(store, seen) == 1
+    assert store["9201"]["media_path"] == "/media/videos/v-web.mp4"
+    assert "/media/videos/v-web.mp4" in store["9201"]["html"]
+    assert "/media/videos/v-web.mp4" in (site / "public/news.html").read_text(encoding="utf-8")
+    assert not (site / "public/media/videos/v.mp4").exists()
+    assert bot.load_store(bot.POSTS_STORE)[0]["9201"]["media_path"] == "/media/videos/v-web.mp4"
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import telebot
+
+import bot
+import search
+import simhash
+
+CHANNEL = {"id": -1001, "type": "channel", "username": "newsSVOih"}
+OTHER = {"id": -1002, "type": "channel", "username": "someone_else"}
+
+
+class FakeBotApi:
+    # getUpdates как у Telegram: запрос с offset подтверждает (удаляет) всё, что раньше
+    def __init__(self):
+        self.updates = []
+        self.offsets = []
+        self.next_id = 600
+
+    def post(self, mid, text, chat=CHANNEL):
+        self.updates.append({"update_id": self.next_id, "channel_post": {
+            "message_id": mid, "date": int(time.time()), "chat": chat, "text": text}})
+        self.next_id += 1
+
+    def get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        self.offsets.append(offset)
+        if offset:
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        return self.updates[:limit]
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.reply(urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+                self.reply(urllib.parse.parse_qs(body))
+
+            def reply(self, query):
+                params = {k: v[0] for k, v in query.items()}
+                if self.path.split("?")[0].endswith("/getUpdates"):
+                    data = {"ok": True, "result": api.get_updates(params)}
+                else:
+                    data = {"ok": False, "error_code": 400, "description": "Bad Request: not implemented"}
+                raw = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args):
+                pass
+        return Handler
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "public").mkdir()
+    monkeypatch.setattr(simhash, "index", [None])
+    monkeypatch.setattr(search, "index", {"state": None, "shards": {}, "chunks": {}})
+    monkeypatch.setattr(bot, "DEBOUNCE_SECONDS", 0)
+    monkeypatch.setattr(bot, "FLUSH_RETRY", 0)
+    monkeypatch.setattr(bot, "LONG_POLL_TIMEOUT", 0)
+    monkeypatch.setattr(bot.time, "sleep", lambda s: None)
+    fake = FakeBotApi()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), fake.handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(telebot.apihelper, "API_URL", f"http://127.0.0.1:{server.server_port}/bot{{0}}/{{1}}")
+    yield fake
+    server.shutdown()
+
+
+def stop_after(monkeypatch, polls):
+    # Ctrl-C на следующем опросе после polls
+    real = bot.bot.get_updates
+    calls = [0]
+
+    def get_updates(**kwargs):
+        calls[0] += 1
+        if calls[0] > polls:
+            raise KeyboardInterrupt
+        return real(**kwargs)
+    monkeypatch.setattr(bot.bot, "get_updates", get_updates)
+
+
+def test_posts_published_and_offset_saved(api, monkeypatch):
+    api.post(7001, "Первая новость дня про погоду в Москве")
+    api.post(7002, "Вторая новость дня про курс рубля")
+    stop_after(monkeypatch, 3)
+    bot.run_daemon()
+    store, _ = bot.load_store(bot.POSTS_STORE)
+    assert sorted(store) == ["7001", "7002"]
+    assert bot.load_update_offset() == 602
+
+
+def test_failed_batch_is_retried_and_not_confirmed(api, monkeypatch):
+    api.post(7101, "Новость, на которой обработка упадёт один раз")
+    real = bot.process_posts
+    fails = [1]
+
+    def flaky(*args):
+        if fails[0]:
+            fails[0] -= 1
+            raise RuntimeError("getFile crashed")
+        return real(*args)
+    monkeypatch.setattr(bot, "process_posts", flaky)
+    stop_after(monkeypatch, 3)
+    bot.run_daemon()
+    # Пока пачка не обработана, Telegram опрашивали без подтверждения
+    assert api.offsets[:2] == [0, 0]
+    assert "7101" in bot.load_store(bot.POSTS_STORE)[0]
+    assert bot.load_update_offset() == 601
+
+
+def test_ctrl_c_flushes_buffer(api, monkeypatch):
+    monkeypatch.setattr(bot, "DEBOUNCE_SECONDS", 3600)
+    api.post(7201, "Новость, которая ещё лежит в буфере демона")
+    stop_after(monkeypatch, 1)
+    bot.run_daemon()
+    assert "7201" in bot.load_store(bot.POSTS_STORE)[0]
+    assert bot.load_update_offset() == 601
+
+
+def test_ctrl_c_during_processing_flushes(api, monkeypatch):
+    api.post(7301, "Новость, на обработке которой нажали Ctrl-C")
+    real = bot.process_posts
+    calls = [0]
+
+    def interrupted(*args):
+        calls[0] += 1
+        if calls[0] == 1:
+            raise KeyboardInterrupt
+        return real(*args)
+    monkeypatch.setattr(bot, "process_posts", interrupted)
+    stop_after(monkeypatch, 5)
+    bot.run_daemon()
+    assert "7301" in bot.load_store(bot.POSTS_STORE)[0]
+    assert bot.load_update_offset() == 601
+
+
+def test_offset_saved_for_other_chats(api, monkeypatch):
+    api.post(1, "Чужой канал", chat=OTHER)
+    stop_after(monkeypatch, 1)
+    bot.run_daemon()
+    assert bot.load_update_offset() == 601
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import deploy
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=deploy.S3_BUCKET)
+        yield client
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def objects(client):
+    listing = client.list_objects_v2(Bucket=deploy.S3_BUCKET).get("Contents", [])
+    return {o["Key"]: client.get_object(Bucket=deploy.S3_BUCKET, Key=o["Key"])["Body"].read().decode()
+            for o in listing}
+
+
+def run(client, monkeypatch):
+    uploaded = []
+    real = deploy.upload
+    monkeypatch.setattr(deploy, "upload", lambda c, key, meta: uploaded.append(key) or real(c, key, meta))
+    assert deploy.deploy(client=client) == 0
+    return sorted(uploaded)
+
+
+def test_deploy_uploads_only_changes(tmp_path, bucket, monkeypatch):
+    public = tmp_path / "public"
+    write(public / "index.html", "<h1>Главная</h1>")
+    write(public / "news.html", "<p>новости</p>")
+    write(public / "media/photos/" / ("a" * 32 + ".jpg"), "jpeg")
+    # Чужой объект в бакете деплой не трогает
+    bucket.put_object(Bucket=deploy.S3_BUCKET, Key="robots-extra.txt", Body=b"keep")
+
+    assert run(bucket, monkeypatch) == ["index.html", "media/photos/" + "a" * 32 + ".jpg", "news.html"]
+    head = bucket.head_object(Bucket=deploy.S3_BUCKET, Key="index.html")
+    assert head["ContentType"] == "text/html; charset=utf-8"
+    assert head["CacheControl"] == deploy.CACHE_PAGES
+
+    # Без изменений — ничего не заливаем
+    assert run(bucket, monkeypatch) == []
+
+    write(public / "news.html", "<p>свежие новости</p>")
+    (public / "index.html").unlink()
+    assert run(bucket, monkeypatch) == ["news.html"]
+    assert objects(bucket) == {"media/photos/" + "a" * 32 + ".jpg": "jpeg", "news.html": "<p>свежие новости</p>",
+                               "robots-extra.txt": "keep"}
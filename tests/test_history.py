@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import re
+
+import history
+
+
+def test_record_without_time_keeps_its_key():
+    lines = ["TITLE: Оборона Севастополя", "TEXT: 30 октября 1941 года"]
+    first = history.parse_text_record(lines)
+    second = history.parse_text_record(lines)
+    assert first["iso_time"]
+    assert first["key"] == second["key"]
+    assert history.make_record(first, "")["key"] == first["key"]
+
+
+def test_cursor_resets_when_file_is_replaced(tmp_path):
+    path = str(tmp_path / "posts.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("TITLE: Первый\n---\nTITLE: Второй\n")
+    history.save_cursor(path, 15)
+    # Дописали в конец — продолжаем с того же места
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("---\nTITLE: Третий\n")
+    assert history.load_cursor(path) == 15
+    # Заменили файлом длиннее — смещение указывало бы в середину записи
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("TITLE: Совсем другой длинный файл\n---\nTITLE: Ещё\n")
+    assert history.load_cursor(path) == 0
+
+
+def test_feed_ids_are_unique_for_same_time(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "public").mkdir()
+    records = {}
+    for title in ["Первое событие", "Второе событие", "Третье событие"]:
+        post = history.parse_text_record([f"TITLE: {title}", "TIME: 2025-10-30T12:00:00+03:00"])
+        rec = history.make_record(post, "")
+        records[rec["key"]] = rec
+    history.generate_rss(records)
+    rss = (tmp_path / history.RSS_FILE).read_text(encoding="utf-8")
+    atom = (tmp_path / history.ATOM_FILE).read_text(encoding="utf-8")
+    guids = re.findall(r"<guid[^>]*>(.*?)</guid>", rss)
+    ids = re.findall(r"<entry>.*?<id>(.*?)</id>", atom, re.DOTALL)
+    assert len(guids) == len(set(guids)) == 3
+    assert len(ids) == len(set(ids)) == 3
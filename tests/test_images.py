@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import images
+
+
+def test_srcset_keeps_only_written_variants(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "public/media/photos").mkdir(parents=True)
+    (tmp_path / "public/media/photos/a-320.webp").write_bytes(b"x")
+    info = {"width": 800, "height": 600, "src": "/media/photos/a.jpg",
+            "sources": [("image/webp", "/media/photos/a-320.webp 320w, /media/photos/a-640.webp 640w")],
+            "derivatives": ["/media/photos/a-320.webp", "/media/photos/a-640.webp"]}
+    images.pending.append(info)
+    assert images.settle_images() == {"/media/photos/a.jpg": info}
+    assert info["sources"] == [("image/webp", "/media/photos/a-320.webp 320w")]
+    assert info["derivatives"] == ["/media/photos/a-320.webp"]
+
+
+def test_no_variants_renders_plain_img(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    info = {"width": 800, "height": 600, "src": "/media/photos/b.jpg",
+            "sources": [("image/webp", "/media/photos/b-640.webp 640w")],
+            "derivatives": ["/media/photos/b-640.webp"]}
+    images.pending.append(info)
+    images.settle_images()
+    html = images.picture_html(info["src"], info, "Фото")
+    assert "<source" not in html and 'src="/media/photos/b.jpg"' in html
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import requests
+
+import media
+
+URL = "https://api.telegram.org/file/bot123:SECRET/photos/file_1.jpg"
+
+
+def test_failed_download_returns_none_without_token(tmp_path, monkeypatch, capsys):
+    def fail(url, fpath):
+        raise requests.HTTPError(f"404 Client Error: Not Found for url: {url}")
+    monkeypatch.setattr(media, "stream_to_file", fail)
+    assert media.download_and_save(URL, str(tmp_path / "photos"), ".jpg", "uid") is None
+    assert "SECRET" not in capsys.readouterr().out
+
+
+class Response:
+    def __init__(self, status):
+        self.status_code = status
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        raise requests.HTTPError(f"{self.status_code}", response=self)
+
+
+def test_client_errors_are_not_retried(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(media.http, "get", lambda url, **kw: calls.append(url) or Response(404))
+    monkeypatch.setattr(media.time, "sleep", lambda s: None)
+    assert media.download_and_save(URL, str(tmp_path), ".jpg") is None
+    assert len(calls) == 1
+
+    calls.clear()
+    monkeypatch.setattr(media.http, "get", lambda url, **kw: calls.append(url) or Response(503))
+    assert media.download_and_save(URL, str(tmp_path), ".jpg") is None
+    assert len(calls) == media.DOWNLOAD_ATTEMPTS
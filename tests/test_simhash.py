@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import time
+
+from simhash import NearDupIndex, drop_near_dupes
+
+BASE = ("Министерство обороны сообщило, что силы ПВО за ночь перехватили и уничтожили "
+        "двадцать беспилотников над территорией нескольких областей, пострадавших нет")
+OTHER = "Совсем другая новость про запуск ракеты с космодрома Восточный сегодня утром прошёл успешно"
+
+
+def test_newer_duplicate_in_one_batch_is_dropped(tmp_path):
+    now = int(time.time())
+    dupes = NearDupIndex(str(tmp_path / "near_dupes.json"), 3)
+    # Как из fetch_latest_posts: новые сверху
+    posts = [
+        ("3", now, 103, OTHER),
+        ("2", now - 60, 102, BASE.replace("двадцать", "двадцать два")),
+        ("1", now - 120, 101, BASE),
+    ]
+    assert drop_near_dupes(dupes, posts) == {"2": "1"}
+
+
+def test_same_second_keeps_lower_message_id(tmp_path):
+    now = int(time.time())
+    dupes = NearDupIndex(str(tmp_path / "near_dupes.json"), 3)
+    posts = [("11", now, 11, BASE + " сегодня"), ("10", now, 10, BASE)]
+    assert drop_near_dupes(dupes, posts) == {"11": "10"}
+
+
+def test_window_survives_restart(tmp_path):
+    path = str(tmp_path / "near_dupes.json")
+    now = int(time.time())
+    dupes = NearDupIndex(path, 3)
+    assert drop_near_dupes(dupes, [("1", now - 60, 1, BASE)]) == {}
+    dupes.save()
+    again = NearDupIndex(path, 3)
+    assert drop_near_dupes(again, [("2", now, 2, BASE + " по данным властей")]) == {"2": "1"}
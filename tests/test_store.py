@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from store import load_store, append_records, remove_records, compact_store
+
+
+def lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def test_garbage_is_what_compaction_removes(tmp_path):
+    path = str(tmp_path / "store.jsonl")
+    append_records(path, [{"key": str(i), "ts": i} for i in range(10)])
+    append_records(path, [{"key": "1", "ts": 100}])
+    remove_records(path, ["2", "3", "1", "missing"])
+    records, garbage = load_store(path)
+    assert sorted(records) == ["0", "4", "5", "6", "7", "8", "9"]
+    # Замена "1" и три удаления с отметками, отметка для несуществующего ключа
+    assert garbage == 1 + 3 * 2 + 1
+    assert lines(path) - garbage == len(records)
+
+    compact_store(path, records)
+    assert load_store(path) == (records, 0)
+
+
+def test_deleted_then_readded(tmp_path):
+    path = str(tmp_path / "store.jsonl")
+    append_records(path, [{"key": "a"}])
+    remove_records(path, ["a"])
+    append_records(path, [{"key": "a"}])
+    records, garbage = load_store(path)
+    assert list(records) == ["a"] and garbage == 2
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import Future
+
+import pytest
+
+import media
+import videos
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(media, "manifest", [{}])
+    monkeypatch.setattr(media, "unique_index", {})
+    monkeypatch.setattr(videos, "transcodes", [])
+    monkeypatch.setattr(videos, "planned", [])
+    (tmp_path / "public/media/videos").mkdir(parents=True)
+    return tmp_path
+
+
+def plan(stem, unique_id, result=None, error=None):
+    # Как plan_video для большого ролика; job — уже завершённое перекодирование
+    info = {"src": f"{stem}.mp4", "poster": f"{stem}-poster.jpg", "derivatives": [f"{stem}-poster.jpg"],
+            "orig": f"{stem}.mp4", "web": f"{stem}-web.mp4", "unique_id": unique_id}
+    videos.planned.append(info)
+    job = Future()
+    if error:
+        job.set_exception(error)
+    else:
+        job.set_result(result)
+    videos.transcodes.append((job, info))
+    return info
+
+
+def test_missing_poster_is_dropped_from_card(manifest):
+    (manifest / "public/media/videos/a.mp4").write_bytes(b"x")
+    info = plan("/media/videos/a", "uid-a")
+    assert videos.settle_videos() == {"/media/videos/a.mp4": info}
+    assert info["poster"] is None and info["derivatives"] == []
+    assert "poster=" not in videos.video_html(info["src"], info)
+
+
+def test_transcoded_video_replaces_source(manifest):
+    (manifest / "public/media/videos/b.mp4").write_bytes(b"x" * 10)
+    (manifest / "public/media/videos/b-web.mp4").write_bytes(b"x")
+    info = plan("/media/videos/b", "uid-b")
+    assert videos.pending_web("/media/videos/b.mp4") == "/media/videos/b-web.mp4"
+    assert videos.transcoded() == [info]
+    assert info["src"] == "/media/videos/b-web.mp4"
+    assert media.find_media("uid-b") == "/media/videos/b-web.mp4"
+    media.register_media("/media/videos/b.mp4", "post-b")
+    media.replace_media("/media/videos/b.mp4", info["src"], "post-b")
+    videos.remove_source(info)
+    assert not (manifest / "public/media/videos/b.mp4").exists()
+
+
+def test_failed_transcode_keeps_source(manifest):
+    (manifest / "public/media/videos/c.mp4").write_bytes(b"x")
+    info = plan("/media/videos/c", "uid-c", error=RuntimeError("ffmpeg"))
+    assert videos.transcoded(wait=True) == []
+    assert info["src"] == "/media/videos/c.mp4" and videos.transcodes == []
+
+
+def test_failed_ffmpeg_leaves_no_part_files(manifest, monkeypatch):
+    def broken(*args):
+        with open(args[-1], "wb") as f:
+            f.write(b"half")
+        raise RuntimeError("ffmpeg")
+    monkeypatch.setattr(videos, "ffmpeg", broken)
+    src = str(manifest / "public/media/videos/d.mp4")
+    for job in (lambda: videos.make_poster(src, src[:-4] + "-poster.jpg"),
+                lambda: videos.transcode(src, src[:-4] + "-web.mp4")):
+        with pytest.raises(RuntimeError):
+            job()
+    assert list((manifest / "public/media/videos").iterdir()) == []